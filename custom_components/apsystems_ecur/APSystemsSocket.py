@@ -1,35 +1,119 @@
 #!/usr/bin/env python3
 
-import socket
+import asyncio
 import binascii
 import logging
+import struct
 import time
+from collections import namedtuple
 from datetime import datetime
 
+try:
+    import numpy as np
+except ImportError:
+    # numpy is optional, without it all inverter data goes through the scalar decoder
+    np = None
+
 _LOGGER = logging.getLogger(__name__)
 
+# every inverter record starts with a 6 byte uid, 1 byte online flag and a
+# 2 byte model code followed by the model specific words described below
+INVERTER_HEADER = struct.Struct(">6sB2s")
+
+# words holds frequency and temperature followed by the power/voltage words,
+# power and voltage are the positions of the channel readings within words
+InverterLayout = namedtuple("InverterLayout", ["model", "channel_qty", "words", "power", "voltage"])
+
+YC600_LAYOUT = InverterLayout("YC600/DS3 series", 2, struct.Struct(">6H"), (2, 4), (3, 5))
+INVERTER_LAYOUTS = {
+    b"01": YC600_LAYOUT,
+    b"02": InverterLayout("YC1000/QT2", 4, struct.Struct(">9H"), (2, 4, 6, 8), (3, 5, 7)),
+    b"03": InverterLayout("QS1", 4, struct.Struct(">7H"), (2, 4, 5, 6), (3,)),
+    b"04": YC600_LAYOUT,
+    b"05": YC600_LAYOUT,
+}
+
+# signal records are a 6 byte uid followed by a 1 byte strength
+SIGNAL_RECORD = struct.Struct(">6sB")
+
+# payloads with at least this many inverters of a single layout are decoded
+# in one go with numpy, smaller ones aren't worth the array setup
+VECTOR_MIN_INVERTERS = 64
+
+# decoded state of a single inverter, power and voltage hold one reading per
+# channel, the other readings are None when the model or online state lacks them
+class InverterReading(namedtuple("InverterReading",
+        ["uid", "online", "signal", "model", "channel_qty", "temperature", "frequency", "power", "voltage"],
+        defaults=(None, None, None, None, (), ()))):
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, data):
+        data = {field: value for field, value in data.items() if field in cls._fields}
+        for field in ("power", "voltage"):
+            data[field] = tuple(data.get(field) or ())
+        return cls(**data)
+
+# everything the coordinator hands to the entities, the ECU totals are None
+# when the ECU didn't report them, see query_ecu
+class EcuSnapshot(namedtuple("EcuSnapshot",
+        ["ecu_id", "timestamp", "inverters", "lifetime_energy", "current_power", "today_energy",
+         "qty_of_inverters", "qty_of_online_inverters", "data_from_cache", "querying", "restart_ecu",
+         "poll_duration", "consecutive_failures", "cache_hits", "freshness"],
+        defaults=(None, {}, None, None, None, None, None, False, True, False, None, 0, 0, None))):
+    __slots__ = ()
+
+    def as_dict(self):
+        # plain dicts and lists for the snapshot Store
+        data = self._asdict()
+        data["inverters"] = {uid: inv._asdict() for uid, inv in self.inverters.items()}
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        data = {field: value for field, value in data.items() if field in cls._fields}
+        data["inverters"] = {uid: InverterReading.from_dict(inv) for uid, inv in data.get("inverters", {}).items()}
+        return cls(**data)
+
+INVERTER_DTYPES = {}
+
+def inverter_dtype(layout):
+    # structured numpy dtype matching INVERTER_HEADER followed by the layout words
+    if layout not in INVERTER_DTYPES:
+        INVERTER_DTYPES[layout] = np.dtype([
+            ("uid", "V6"),
+            ("online", "u1"),
+            ("model", "S2"),
+            ("words", ">u2", (layout.words.size // 2,)),
+        ])
+    return INVERTER_DTYPES[layout]
+
 class APSystemsInvalidData(Exception):
     pass
 
 class APSystemsSocket:
-    def __init__(self, ipaddr, nographs, port=8899, raw_ecu=None, raw_inverter=None):
-        global no_graphs
-        no_graphs = nographs
+    def __init__(self, ipaddr, nographs, port=8899, raw_ecu=None, raw_inverter=None, persistent=False):
+        self.no_graphs = nographs
         self.ipaddr = ipaddr
         self.port = port
 
+        # send all commands over a single connection, only for ECU firmware that
+        # tolerates it, we fall back to a connection per command if it doesn't
+        self.persistent = persistent
+
         # what do we expect socket data to end in
         self.recv_suffix = b'END\n'
 
         # how long to wait on socket commands until we get our recv_suffix
         self.timeout = 10
 
-        # how big of a buffer to read at a time from the socket
+        # how big of a buffer to read at a time from the socket, we keep reading
+        # until the whole frame is in so large arrays are no longer truncated
         # https://github.com/ksheumaker/homeassistant-apsystems_ecur/issues/108
         self.recv_size = 1024
 
         # how long to wait between socket open/closes
-        self.socket_sleep_time = 5
+        self.socket_sleep_time = 1
 
         self.cmd_suffix = "END\n"
         self.ecu_query = "APS1100160001" + self.cmd_suffix
@@ -52,99 +136,282 @@ class APSystemsSocket:
         self.ecu_raw_data = raw_ecu
         self.inverter_raw_data = raw_inverter
         self.inverter_raw_signal = None
+        # columnar numpy view of the last inverter payload when it could be decoded that way
+        self.inverter_arrays = None
+        # frames self.inverters was decoded from, the ECU repeats them byte for byte
+        # until it collected new data, so an identical reply is not decoded again
+        self.decoded_frames = None
+        self.inverter_data_unchanged = False
+        # when the ECU, inverter and signal queries last returned a good frame, as
+        # local time for the snapshot and monotonic seconds for the query cadence
+        self.freshness = {}
+        self.read_at = {}
+        # queries of the last poll that failed and were filled in with their last good frame, with the error
+        self.failed_queries = {}
+        # logger receiving every raw frame sent and received when wire tracing is on
+        self.wire_logger = None
         self.read_buffer = b''
-        self.socket = None
+        self.reader = None
+        self.writer = None
         self.socket_open = False
         self.errors = []
+        # how long each phase of the last query took in seconds, plus the bytes received
+        self.timings = {}
 
-    def send_read_from_socket(self, cmd):
+    def frame_complete(self, data):
+        # a frame is complete when it ends in our recv_suffix and holds at least
+        # the amount of bytes announced by the length field at bytes 5-9
+        if not data.endswith(self.recv_suffix):
+            return False
+        length = data[5:9]
+        if len(data) < 9 or not length.isdigit():
+            return True
+        return len(data) - 1 >= int(length)
+
+    async def read_frame(self):
+        # An infinite loop was causing the integration to block
+        # https://github.com/ksheumaker/homeassistant-apsystems_ecur/issues/115
+        # so the whole read shares a single deadline instead of one per recv
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        # kept in read_buffer so what arrived before a failure can be traced
+        self.read_buffer = buffer = bytearray()
+        while not self.frame_complete(buffer):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            chunk = await asyncio.wait_for(self.reader.read(self.recv_size), remaining)
+            if not chunk:
+                # ECU closed the connection, let the checksum judge what we got
+                break
+            buffer += chunk
+        return bytes(buffer)
+
+    def add_timing(self, phase, start):
+        self.timings[phase] = self.timings.get(phase, 0) + time.perf_counter() - start
+
+    def command_phase(self, cmd):
+        if cmd.startswith(self.inverter_query_prefix):
+            return "inverter_query"
+        if cmd.startswith(self.inverter_signal_prefix):
+            return "signal_query"
+        return "ecu_query"
+
+    def trace_frame(self, direction, data):
+        if self.wire_logger is not None:
+            # the raw bytes go along for the capture file
+            self.wire_logger.info("%s %s %s", self.ipaddr, direction, data.hex(),
+                extra={"direction": direction, "frame": bytes(data)})
+
+    async def send_read_from_socket(self, cmd):
         try:
-            self.sock.settimeout(self.timeout)
-            self.sock.sendall(cmd.encode('utf-8'))
-            time.sleep(self.socket_sleep_time)
+            start = time.perf_counter()
             self.read_buffer = b''
-            self.sock.settimeout(self.timeout)
-            # An infinite loop was causing the integration to block
-            # https://github.com/ksheumaker/homeassistant-apsystems_ecur/issues/115
-            # Solution might cause a new issue when large solar array's applies
-            self.read_buffer = self.sock.recv(self.recv_size)
+            self.trace_frame("send", cmd.encode('utf-8'))
+            self.writer.write(cmd.encode('utf-8'))
+            await asyncio.wait_for(self.writer.drain(), self.timeout)
+            self.read_buffer = await self.read_frame()
+            self.add_timing(self.command_phase(cmd), start)
+            self.timings["bytes_received"] = self.timings.get("bytes_received", 0) + len(self.read_buffer)
+            self.trace_frame("recv", self.read_buffer)
             return self.read_buffer
+        except asyncio.TimeoutError:
+            self.trace_frame("error", self.read_buffer)
+            await self.close_socket()
+            raise APSystemsInvalidData("timed out")
         except Exception as err:
-            self.close_socket()
+            self.trace_frame("error", self.read_buffer)
+            await self.close_socket()
             raise APSystemsInvalidData(err)
 
-    def close_socket(self):
+    async def close_socket(self):
         try:
             if self.socket_open:
-                self.sock.shutdown(socket.SHUT_RDWR)
-                self.sock.close()
                 self.socket_open = False
+                self.writer.close()
+                await asyncio.wait_for(self.writer.wait_closed(), self.timeout)
         except Exception as err:
             raise APSystemsInvalidData(err)
             
-    def open_socket(self):
+    async def open_socket(self):
         self.socket_open = False
         try:
-            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            # self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
-            self.sock.settimeout(self.timeout)
-            self.sock.connect((self.ipaddr, self.port))
+            start = time.perf_counter()
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(self.ipaddr, self.port), self.timeout)
+            self.add_timing("connect", start)
             self.socket_open = True
+        except asyncio.TimeoutError:
+            raise APSystemsInvalidData("timed out")
         except Exception as err:
             raise APSystemsInvalidData(err)
 
-    def query_ecu(self):
+    async def probe(self, timeout):
+        # only connect and disconnect, a cheap check that the ECU is reachable
+        # before it gets the three queries
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.ipaddr, self.port), timeout)
+            writer.close()
+            await asyncio.wait_for(writer.wait_closed(), timeout)
+        except asyncio.TimeoutError:
+            raise APSystemsInvalidData("timed out")
+        except Exception as err:
+            raise APSystemsInvalidData(err)
+        # Some ECUs like a pause between connections
+        await asyncio.sleep(self.socket_sleep_time)
+
+    def mark_fresh(self, query):
+        self.freshness[query] = datetime.now().isoformat(timespec="seconds")
+        self.read_at[query] = time.monotonic()
+
+    def keep_last_frame(self, query, last_frame, err):
+        # the inverter or signal query failed, the other replies are still good so
+        # carry on with the last good frame of this one. Without the ECU totals or
+        # an earlier frame there is nothing to merge with and the poll fails
+        if last_frame is None:
+            raise err
+        self.failed_queries[query] = str(err)
+        _LOGGER.debug("The %s query failed: %s, using its frame from %s", query, err, self.freshness.get(query))
+
+    async def read_command(self, cmd, name):
+        # one command over its own connection, the reply is checked before it replaces the last good one
+        # Some ECUs like the socket to be closed and re-opened between commands
+        await asyncio.sleep(self.socket_sleep_time)
+        await self.open_socket()
+        reply = await self.send_read_from_socket(cmd)
+        await self.close_socket()
+        self.check_ecu_checksum(reply, name)
+        return reply
+
+    async def query_ecu_per_command(self, inverters=True, signal=True):
         #read ECU data
-        self.open_socket()
-        self.ecu_raw_data = self.send_read_from_socket(self.ecu_query)
-        self.close_socket()
+        await self.open_socket()
+        self.ecu_raw_data = await self.send_read_from_socket(self.ecu_query)
+        await self.close_socket()
         try:
+            start = time.perf_counter()
             self.process_ecu_data()
+            self.add_timing("parse", start)
         except Exception as err:
             raise APSystemsInvalidData(err)
-        
+        self.mark_fresh("ecu")
+
         #read inverter data
-        # Some ECUs like the socket to be closed and re-opened between commands
-        self.open_socket()
-        cmd = self.inverter_query_prefix + self.ecu_id + self.inverter_query_suffix
-        self.inverter_raw_data = self.send_read_from_socket(cmd)
-        self.close_socket()
-        
+        if inverters:
+            try:
+                cmd = self.inverter_query_prefix + self.ecu_id + self.inverter_query_suffix
+                self.inverter_raw_data = await self.read_command(cmd, "Inverter data")
+                self.mark_fresh("inverters")
+            except APSystemsInvalidData as err:
+                self.keep_last_frame("inverters", self.inverter_raw_data, err)
+
         #read signal data
-        # Some ECUs like the socket to be closed and re-opened between commands
-        self.open_socket()
-        cmd = self.inverter_signal_prefix + self.ecu_id + self.inverter_signal_suffix
-        self.inverter_raw_signal = self.send_read_from_socket(cmd)
-        self.close_socket()
-        
+        if signal:
+            try:
+                cmd = self.inverter_signal_prefix + self.ecu_id + self.inverter_signal_suffix
+                self.inverter_raw_signal = await self.read_command(cmd, "Signal Query")
+                self.mark_fresh("signal")
+            except APSystemsInvalidData as err:
+                self.keep_last_frame("signal", self.inverter_raw_signal, err)
+
+    async def query_ecu_persistent(self, inverters=True, signal=True):
+        # all three commands back to back over one connection, every reply is
+        # validated here so a misbehaving ECU is detected before we parse
+        await self.open_socket()
+        try:
+            self.ecu_raw_data = await self.send_read_from_socket(self.ecu_query)
+            start = time.perf_counter()
+            self.process_ecu_data()
+            self.add_timing("parse", start)
+            self.mark_fresh("ecu")
+
+            if inverters:
+                cmd = self.inverter_query_prefix + self.ecu_id + self.inverter_query_suffix
+                reply = await self.send_read_from_socket(cmd)
+                self.check_ecu_checksum(reply, "Inverter data")
+                self.inverter_raw_data = reply
+                self.mark_fresh("inverters")
+
+            if signal:
+                cmd = self.inverter_signal_prefix + self.ecu_id + self.inverter_signal_suffix
+                reply = await self.send_read_from_socket(cmd)
+                self.check_ecu_checksum(reply, "Signal Query")
+                self.inverter_raw_signal = reply
+                self.mark_fresh("signal")
+        except Exception as err:
+            raise APSystemsInvalidData(err)
+        finally:
+            await self.close_socket()
+
+    async def query_ecu(self, inverters=True, signal=True):
+        # the ECU totals are always queried, the inverter and signal queries only
+        # when asked for, their last good frames are decoded again otherwise
+        self.timings = {}
+        self.failed_queries = {}
+        if not self.persistent:
+            await self.query_ecu_per_command(inverters, signal)
+        else:
+            try:
+                await self.query_ecu_persistent(inverters, signal)
+            except APSystemsInvalidData as err:
+                _LOGGER.debug("Query over a persistent connection failed: %s, retrying with a connection per command", err)
+                await asyncio.sleep(self.socket_sleep_time)
+                await self.query_ecu_per_command(inverters, signal)
+                # the ECU answers when we reconnect per command, so it's the
+                # persistent connection it doesn't like, stop using it
+                if not self.failed_queries:
+                    _LOGGER.warning(f"ECU {self.ecu_id} does not support a persistent connection, using a connection per command from now on")
+                    self.persistent = False
+
+        start = time.perf_counter()
         data = self.process_inverter_data()
-        data["ecu_id"] = self.ecu_id
-        if self.lifetime_energy != 0:
-            data["lifetime_energy"] = self.lifetime_energy
-        data["current_power"] = self.current_power
+        self.add_timing("parse", start)
         # apply filter for ECU-R-pro firmware bug where both are zero
-        if self.qty_of_inverters > 0:
-            data["qty_of_inverters"] = self.qty_of_inverters
-            data["today_energy"] = self.today_energy
-        data["qty_of_online_inverters"] = self.qty_of_online_inverters
-        return(data)
+        reported = self.qty_of_inverters > 0
+        return EcuSnapshot(
+            ecu_id=self.ecu_id,
+            timestamp=data.get("timestamp"),
+            inverters=data.get("inverters", {}),
+            lifetime_energy=self.lifetime_energy if self.lifetime_energy != 0 else None,
+            current_power=self.current_power,
+            today_energy=self.today_energy if reported else None,
+            qty_of_inverters=self.qty_of_inverters if reported else None,
+            qty_of_online_inverters=self.qty_of_online_inverters,
+            freshness=dict(self.freshness))
+
+    def dump_data(self):
+        return {
+            "ipaddr": self.ipaddr,
+            "port": self.port,
+            "persistent": self.persistent,
+            "ecu_id": self.ecu_id,
+            "firmware": self.firmware,
+            "timezone": self.timezone,
+            "last_update": self.last_update,
+            "qty_of_inverters": self.qty_of_inverters,
+            "qty_of_online_inverters": self.qty_of_online_inverters,
+            "timings": self.timings,
+            "inverter_data_unchanged": self.inverter_data_unchanged,
+            "freshness": self.freshness,
+            "failed_queries": self.failed_queries,
+            "ecu_raw_data": self.ecu_raw_data.hex() if self.ecu_raw_data else None,
+            "inverter_raw_data": self.inverter_raw_data.hex() if self.inverter_raw_data else None,
+            "inverter_raw_signal": self.inverter_raw_signal.hex() if self.inverter_raw_signal else None,
+        }
 
     def aps_int_from_bytes(self, codec: bytes, start: int, length: int) -> int:
-        try:
-            return int (binascii.b2a_hex(codec[(start):(start+length)]), 16)
-        except ValueError as err:
+        if len(codec) < start + length or length < 1:
             debugdata = binascii.b2a_hex(codec)
             error = f"Unable to convert binary to int with length={length} at location={start} with data={debugdata}"
             raise APSystemsInvalidData(error)
+        return int.from_bytes(codec[start:(start+length)], "big")
 
-    def aps_uid(self, codec, start):
-        return str(binascii.b2a_hex(codec[(start):(start+12)]))[2:14]
-    
     def aps_str(self, codec, start, amount):
-        return str(codec[start:(start+amount)])[2:(amount+2)]
+        return codec[start:(start+amount)].decode("ascii", errors="backslashreplace")
     
     def aps_datetimestamp(self, codec, start, amount):
-        timestr=str(binascii.b2a_hex(codec[start:(start+amount)]))[2:(amount+2)]
+        timestr = codec[start:(start+amount)].hex()[0:amount]
         return timestr[0:4]+"-"+timestr[4:6]+"-"+timestr[6:8]+" "+timestr[8:10]+":"+timestr[10:12]+":"+timestr[12:14]
 
     def check_ecu_checksum(self, data, cmd):
@@ -179,7 +446,9 @@ class APSystemsSocket:
     def process_ecu_data(self, data=None):
         if self.ecu_raw_data != '' and (self.aps_str(self.ecu_raw_data,9,4)) == '0001':
             data = self.ecu_raw_data
-            _LOGGER.debug(binascii.b2a_hex(data))
+            # hex encoding the whole frame is only worth it when someone reads it
+            if _LOGGER.isEnabledFor(logging.DEBUG):
+                _LOGGER.debug("ECU data: %s", data.hex())
             self.check_ecu_checksum(data, "ECU Query")
             self.ecu_id = self.aps_str(data, 13, 12)
             self.lifetime_energy = self.aps_int_from_bytes(data, 27, 4) / 10
@@ -202,149 +471,163 @@ class APSystemsSocket:
         signal_data = {}
         if self.inverter_raw_signal != '' and (self.aps_str(self.inverter_raw_signal,9,4)) == '0030':
             data = self.inverter_raw_signal
-            _LOGGER.debug(binascii.b2a_hex(data))
+            # hex encoding the whole frame is only worth it when someone reads it
+            if _LOGGER.isEnabledFor(logging.DEBUG):
+                _LOGGER.debug("Signal data: %s", data.hex())
             self.check_ecu_checksum(data, "Signal Query")
             if not self.qty_of_inverters:
                 return signal_data
+            view = memoryview(data)
             location = 15
-            for i in range(0, self.qty_of_inverters):
-                uid = self.aps_uid(data, location)
-                location += 6
-                strength = data[location]
-                location += 1
-                strength = int((strength / 255) * 100)
-                signal_data[uid] = strength
+            try:
+                for i in range(0, self.qty_of_inverters):
+                    uid, strength = SIGNAL_RECORD.unpack_from(view, location)
+                    location += SIGNAL_RECORD.size
+                    signal_data[uid.hex()] = int((strength / 255) * 100)
+            except struct.error as err:
+                raise APSystemsInvalidData(f"Signal data too short for {self.qty_of_inverters} inverters at location={location}: {err}")
             return signal_data
 
+    def build_inverter(self, inverter_uid, online, signal, layout=None, frequency=None, temperature=None, power=None, voltages=None):
+        # Should graphs be updated?
+        no_update = online == False and self.no_graphs == True
+        if no_update:
+            signal = None
+
+        # Distinguishes the different inverters from this point down
+        if layout is None:
+            return InverterReading(inverter_uid, online, signal)
+
+        if not online:
+            temperature = None
+        if no_update:
+            frequency = None
+            power = (None,) * len(layout.power)
+            voltages = (None,) * len(layout.voltage)
+        return InverterReading(inverter_uid, online, signal, layout.model, layout.channel_qty,
+            temperature, frequency, tuple(power), tuple(voltages))
+
+    def process_inverter_record(self, view, location, signal):
+        # decode a single inverter record, returns the inverter and the location of the next record
+        uid, online, istr = INVERTER_HEADER.unpack_from(view, location)
+        location += INVERTER_HEADER.size
+        inverter_uid = uid.hex()
+        layout = INVERTER_LAYOUTS.get(istr)
+        if layout is None:
+            return self.build_inverter(inverter_uid, bool(online), signal.get(inverter_uid, 0)), location
+
+        words = layout.words.unpack_from(view, location)
+        inv = self.build_inverter(inverter_uid, bool(online), signal.get(inverter_uid, 0), layout,
+            frequency=words[0] / 10,
+            temperature=words[1] - 100,
+            power=[words[i] for i in layout.power],
+            voltages=[words[i] for i in layout.voltage])
+        return inv, location + layout.words.size
+
+    def process_signal_arrays(self, uids):
+        # signal strength in the order of uids, None when there is no signal frame
+        data = self.inverter_raw_signal
+        if not data or self.aps_str(data, 9, 4) != '0030':
+            return None
+        self.check_ecu_checksum(data, "Signal Query")
+        if not self.qty_of_inverters:
+            return np.zeros(len(uids), dtype=np.int64)
+        if len(data) < 15 + self.qty_of_inverters * SIGNAL_RECORD.size:
+            raise APSystemsInvalidData(f"Signal data too short for {self.qty_of_inverters} inverters")
+        records = np.frombuffer(data, dtype=[("uid", "V6"), ("strength", "u1")], count=self.qty_of_inverters, offset=15)
+        strength = ((records["strength"] / 255) * 100).astype(np.int64)
+        if len(records) == len(uids) and np.array_equal(records["uid"], uids):
+            return strength
+        # ECU listed the inverters in a different order, match them up by uid
+        lookup = dict(zip(records["uid"].tolist(), strength.tolist()))
+        return np.array([lookup.get(uid, 0) for uid in uids.tolist()], dtype=np.int64)
+
+    def process_inverter_arrays(self, data, inverter_qty):
+        # columnar decode of a payload where every inverter shares one layout,
+        # returns None so the caller uses the scalar decoder when that isn't the case
+        if np is None or inverter_qty < 1 or len(data) < 35:
+            return None
+        layout = INVERTER_LAYOUTS.get(bytes(data[33:35]))
+        if layout is None:
+            return None
+        dtype = inverter_dtype(layout)
+        if len(data) < 26 + inverter_qty * dtype.itemsize:
+            return None
+        records = np.frombuffer(data, dtype=dtype, count=inverter_qty, offset=26)
+        for model in np.unique(records["model"]).tolist():
+            if INVERTER_LAYOUTS.get(model) is not layout:
+                return None
+        signal = self.process_signal_arrays(records["uid"])
+        if signal is None:
+            return None
+        words = records["words"]
+        return {
+            "layout": layout,
+            "uid": [uid.hex() for uid in records["uid"].tolist()],
+            "online": records["online"].astype(bool),
+            "frequency": words[:, 0] / 10,
+            "temperature": words[:, 1].astype(np.int64) - 100,
+            "power": words[:, list(layout.power)],
+            "voltage": words[:, list(layout.voltage)],
+            "signal": signal,
+        }
+
+    def inverters_from_arrays(self, arrays):
+        layout = arrays["layout"]
+        inverters = {}
+        columns = zip(arrays["uid"], arrays["online"].tolist(), arrays["signal"].tolist(),
+            arrays["frequency"].tolist(), arrays["temperature"].tolist(),
+            arrays["power"].tolist(), arrays["voltage"].tolist())
+        for inverter_uid, online, signal, frequency, temperature, power, voltages in columns:
+            inverters[inverter_uid] = self.build_inverter(inverter_uid, online, signal, layout,
+                frequency=frequency, temperature=temperature, power=power, voltages=voltages)
+        return inverters
+
+    def process_inverter_records(self, data, inverter_qty):
+        # scalar decoder, walks the records one by one and handles mixed models
+        signal = self.process_signal_data()
+        inverters = {}
+        if self.aps_str(data, 15, 2) == '01':
+            view = memoryview(data)
+            location = 26
+            try:
+                for i in range(0, inverter_qty):
+                    inv, location = self.process_inverter_record(view, location, signal)
+                    inverters[inv.uid] = inv
+            except struct.error as err:
+                raise APSystemsInvalidData(f"Inverter data too short for {inverter_qty} inverters at location={location}: {err}")
+        return inverters
+
     def process_inverter_data(self, data=None):
         output = {}
         if self.inverter_raw_data != '' and (self.aps_str(self.inverter_raw_data,9,4)) == '0002':
             data = self.inverter_raw_data
-            _LOGGER.debug(binascii.b2a_hex(data))
+            # hex encoding the whole frame is only worth it when someone reads it
+            if _LOGGER.isEnabledFor(logging.DEBUG):
+                _LOGGER.debug("Inverter data: %s", data.hex())
             self.check_ecu_checksum(data, "Inverter data")
-            istr = ''
-            cnt1 = 0
-            cnt2 = 26
             if self.aps_str(data, 14, 2) == '00':
                 timestamp = self.aps_datetimestamp(data, 19, 14)
                 inverter_qty = self.aps_int_from_bytes(data, 17, 2)
                 self.last_update = timestamp
                 output["timestamp"] = timestamp
                 output["inverters"] = {}
-                signal = self.process_signal_data()
-                inverters = {}
-                
-                while cnt1 < inverter_qty:
-                    inv={}
-                    if self.aps_str(data, 15, 2) == '01':
-                        inverter_uid = self.aps_uid(data, cnt2)
-                        inv["uid"] = inverter_uid
-                        inv["online"] = bool(self.aps_int_from_bytes(data, cnt2 + 6, 1))
-                        istr = self.aps_str(data, cnt2 + 7, 2)
-
-                        # Should graphs be updated?
-                        if inv["online"] == False and no_graphs == True:
-                            inv["signal"] = None
-                        else:
-                            inv["signal"] = signal.get(inverter_uid, 0)
-                       
-                        # Distinguishes the different inverters from this point down
-                        if istr in [ '01', '04', '05']:
-                            power = []
-                            voltages = []
-
-                            # Should graphs be updated? 
-                            if inv["online"] == True:
-                                inv["temperature"] = self.aps_int_from_bytes(data, cnt2 + 11, 2) - 100
-                            if inv["online"] == False and no_graphs == True:
-                                inv["frequency"] = None
-                                power.append(None)
-                                voltages.append(None)
-                                power.append(None)
-                                voltages.append(None)
-                            else:
-                                inv["frequency"] = self.aps_int_from_bytes(data, cnt2 + 9, 2) / 10
-                                power.append(self.aps_int_from_bytes(data, cnt2 + 13, 2))
-                                voltages.append(self.aps_int_from_bytes(data, cnt2 + 15, 2))
-                                power.append(self.aps_int_from_bytes(data, cnt2 + 17, 2))
-                                voltages.append(self.aps_int_from_bytes(data, cnt2 + 19, 2))
-
-                            inv_details = {
-                            "model" : "YC600/DS3 series",
-                            "channel_qty" : 2,
-                            "power" : power,
-                            "voltage" : voltages
-                            }
-                            inv.update(inv_details)
-                            cnt2 = cnt2 + 21
-                        elif istr == '02':
-                            power = []
-                            voltages = []
-
-                            # Should graphs be updated? 
-                            if inv["online"]:
-                                inv["temperature"] = self.aps_int_from_bytes(data, cnt2 + 11, 2) - 100
-                            if inv["online"] == False and no_graphs == True:
-                                inv["frequency"] = None
-                                power.append(None)
-                                voltages.append(None)
-                                power.append(None)
-                                voltages.append(None)
-                                power.append(None)
-                                voltages.append(None)
-                                power.append(None)
-                            else:
-                                inv["frequency"] = self.aps_int_from_bytes(data, cnt2 + 9, 2) / 10
-                                power.append(self.aps_int_from_bytes(data, cnt2 + 13, 2))
-                                voltages.append(self.aps_int_from_bytes(data, cnt2 + 15, 2))
-                                power.append(self.aps_int_from_bytes(data, cnt2 + 17, 2))
-                                voltages.append(self.aps_int_from_bytes(data, cnt2 + 19, 2))
-                                power.append(self.aps_int_from_bytes(data, cnt2 + 21, 2))
-                                voltages.append(self.aps_int_from_bytes(data, cnt2 + 23, 2))
-                                power.append(self.aps_int_from_bytes(data, cnt2 + 25, 2))
-
-                            inv_details = {
-                            "model" : "YC1000/QT2",
-                            "channel_qty" : 4,
-                            "power" : power,
-                            "voltage" : voltages
-                            }
-                            inv.update(inv_details)
-                            cnt2 = cnt2 + 27
-                        elif istr == '03':
-                            power = []
-                            voltages = []
-
-                            # Should graphs be updated? 
-                            if inv["online"]:
-                                inv["temperature"] = self.aps_int_from_bytes(data, cnt2 + 11, 2) - 100
-                            if inv["online"] == False and no_graphs == True:
-                                inv["frequency"] = None
-                                power.append(None)
-                                voltages.append(None)
-                                power.append(None)
-                                power.append(None)
-                                power.append(None)
-                            else:
-                                inv["frequency"] = self.aps_int_from_bytes(data, cnt2 + 9, 2) / 10
-                                power.append(self.aps_int_from_bytes(data, cnt2 + 13, 2))
-                                voltages.append(self.aps_int_from_bytes(data, cnt2 + 15, 2))
-                                power.append(self.aps_int_from_bytes(data, cnt2 + 17, 2))
-                                power.append(self.aps_int_from_bytes(data, cnt2 + 19, 2))
-                                power.append(self.aps_int_from_bytes(data, cnt2 + 21, 2))
-
-                            inv_details = {
-                            "model" : "QS1",
-                            "channel_qty" : 4,
-                            "power" : power,
-                            "voltage" : voltages
-                            }
-                            inv.update(inv_details)
-                            cnt2 = cnt2 + 23
-                        else:
-                            cnt2 = cnt2 + 9
-                        inverters[inverter_uid] = inv
-                    cnt1 = cnt1 + 1
+                # comparing the frames is exact and cheaper than hashing them
+                frames = (data, self.inverter_raw_signal, self.qty_of_inverters)
+                self.inverter_data_unchanged = frames == self.decoded_frames
+                if self.inverter_data_unchanged:
+                    _LOGGER.debug("Inverter data from %s is unchanged, reusing the decoded inverters", timestamp)
+                    output["inverters"] = self.inverters
+                    return (output)
+                self.decoded_frames = None
+                self.inverter_arrays = None
+                if self.aps_str(data, 15, 2) == '01' and inverter_qty >= VECTOR_MIN_INVERTERS:
+                    self.inverter_arrays = self.process_inverter_arrays(data, inverter_qty)
+                if self.inverter_arrays is not None:
+                    inverters = self.inverters_from_arrays(self.inverter_arrays)
+                else:
+                    inverters = self.process_inverter_records(data, inverter_qty)
                 self.inverters = inverters
+                self.decoded_frames = frames
                 output["inverters"] = inverters
                 return (output)
@@ -1,17 +1,37 @@
+import aiohttp
+import asyncio
 import logging
-import requests
+import queue
+import time
+from collections import deque
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 import voluptuous as vol
 import traceback
 import datetime as dt
 from datetime import timedelta
 
-from .APSystemsSocket import APSystemsSocket, APSystemsInvalidData
+from .APSystemsSocket import APSystemsSocket, APSystemsInvalidData, EcuSnapshot, InverterReading
+from .fleet import FleetPoller
+from .adaptive import AdaptiveInterval, ADAPTIVE_MIN_INTERVAL
+from .history import ReadingHistory
+from .capture import CaptureHandler
+from .commands import InverterCommandQueue
+from .breaker import CircuitBreaker, BREAKER_HALF_OPEN
+from .curtailment import ExportLimiter
+from .services import async_setup_services, async_unload_services
 import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers.discovery import load_platform
 from homeassistant.helpers.entity import Entity
 from homeassistant import config_entries, exceptions
 from homeassistant.helpers import device_registry as dr
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.event import async_track_state_change_event
+from homeassistant.helpers.storage import Store
+from homeassistant.helpers.sun import get_astral_event_next, is_up
+from homeassistant.util import dt as dt_util
 from homeassistant.components.persistent_notification import (
     create as create_persistent_notification
     )
@@ -20,151 +40,522 @@ from homeassistant.helpers.update_coordinator import (
     DataUpdateCoordinator,
     UpdateFailed,
     )
-from .const import DOMAIN
+from .const import (
+    DOMAIN,
+    FLEET,
+    CONF_WIRE_TRACE,
+    CONF_ADAPTIVE,
+    CONF_EXPORT_SENSOR,
+    CONF_EXPORT_LIMIT,
+    CONF_INVERTER_INTERVAL,
+    CONF_SIGNAL_INTERVAL,
+    WIRE_TRACE_MAX_BYTES,
+    WIRE_TRACE_BACKUPS,
+    CAPTURE_MAX_BYTES,
+    HTTP_TIMEOUT,
+    COMMAND_BATCH_DELAY,
+    COMMAND_BATCH_SIZE,
+    EXPORT_HYSTERESIS,
+    EXPORT_DWELL,
+    BREAKER_BASE_DELAY,
+    BREAKER_MAX_DELAY,
+    PROBE_TIMEOUT,
+    QUERY_CADENCE_SLACK,
+    SIGNAL_INVERTERS_SWITCHED,
+    STORAGE_VERSION,
+    SNAPSHOT_SAVE_DELAY,
+    POLL_HISTORY,
+    HISTORY_SIZE,
+)
 
 _LOGGER = logging.getLogger(__name__)
 PLATFORMS = [ "sensor", "binary_sensor", "switch" ]
 
-class WiFiSet():
-    ipaddr = ""
-    ssid = ""
-    wpa = ""
-    cache = 3
-WiFiSet = WiFiSet()
+# compared against inverters that weren't in the previous snapshot
+NO_READING = InverterReading(None, None, None)
 
 # handle all the communications with the ECUR class and deal with our need for caching, etc
 class ECUR():
-    def __init__(self, ipaddr, ssid, wpa, cache, nographs):
-        self.ecu = APSystemsSocket(ipaddr, nographs)
+    def __init__(self, ipaddr, ssid, wpa, cache, nographs, persistent=False, inverter_interval=0, signal_interval=0):
+        self.ecu = APSystemsSocket(ipaddr, nographs, persistent=persistent)
+        # seconds between the inverter and signal queries, 0 runs them with every ECU query
+        self.inverter_interval = inverter_interval
+        self.signal_interval = signal_interval
         self.cache_count = 0
         self.data_from_cache = False
         self.querying = True
         self.inverters_online = True
+        # on/off state of single inverters switched since all of them were, the ECU doesn't report it
+        self.inverter_states = {}
+        self.commands = InverterCommandQueue(self.switch_inverters, COMMAND_BATCH_DELAY, COMMAND_BATCH_SIZE)
+        # ExportLimiter switching inverters to follow a grid meter, when configured
+        self.limiter = None
+        self.limit_lock = asyncio.Lock()
+        # inverters the export limit switched off before a restart, or that couldn't
+        # be switched back on, still to be switched on. Kept in the Store with the snapshot
+        self.curtailed_before = {}
         self.ecu_restarting = False
-        self.cached_data = {}
-        WiFiSet.ipaddr = ipaddr
-        WiFiSet.ssid = ssid
-        WiFiSet.wpa = wpa
-        WiFiSet.cache = cache
+        self.cached_data = None
+        # previous snapshot and the entity keys that changed since
+        self.previous_data = None
+        self.previous_attributes = None
+        self.changed = None
+        # Store holding the last good snapshot and Home Assistant's shared aiohttp
+        # session for the ECU web interface, both set up by async_setup_entry
+        self.store = None
+        self.session = None
+        # poll statistics, the history keeps the phase timings of the last polls
+        self.consecutive_failures = 0
+        self.cache_hits = 0
+        self.poll_duration = None
+        self.poll_history = deque(maxlen=POLL_HISTORY)
+        # whether the last fetch_data went out to the ECU, only those polls are recorded
+        self.contacted = False
+        # backs off from an ECU that stopped answering and resumes when it answers again
+        self.breaker = CircuitBreaker(cache, BREAKER_BASE_DELAY, BREAKER_MAX_DELAY)
+        # recent readings of every inverter, for the get_history service and diagnostics
+        self.history = ReadingHistory(HISTORY_SIZE)
+        # ReadingExporter the new readings are appended to, see the export_readings service
+        self.exporter = None
+        self.export_lock = asyncio.Lock()
+        self.ipaddr = ipaddr
+        self.ssid = ssid
+        self.wpa = wpa
+        self.cache = cache
+
+    def restore_snapshot(self, stored):
+        # seed the cache with the last good snapshot saved before a restart
+        self.curtailed_before = dict((stored or {}).get("curtailed", {}))
+        data = (stored or {}).get("data", {})
+        if data.get("ecu_id", None) == None:
+            return None
+        self.cached_data = EcuSnapshot.from_dict(data)
+        self.data_from_cache = True
+        self.ecu.ecu_id = self.cached_data.ecu_id
+        self.ecu.firmware = stored.get("firmware")
+        self.ecu.timezone = stored.get("timezone")
+        self.ecu.last_update = self.cached_data.timestamp
+        return self.cached_data._replace(data_from_cache=self.data_from_cache)
+
+    def snapshot_to_store(self):
+        return {
+            "data": self.cached_data.as_dict() if self.cached_data is not None else {},
+            "firmware": self.ecu.firmware,
+            "timezone": self.ecu.timezone,
+            "curtailed": self.curtailed_inverters(),
+        }
+
+    def curtailed_inverters(self):
+        # every inverter switched off by the export limit, with the power it made before
+        curtailed = dict(self.curtailed_before)
+        if self.limiter is not None:
+            curtailed.update(self.limiter.curtailed)
+        return curtailed
+
+    def save_curtailed(self):
+        # unlike the snapshot this can't wait, the inverters stay off when it's lost
+        if self.store is not None:
+            self.store.async_delay_save(self.snapshot_to_store, 0)
 
     def stop_query(self):
         self.querying = False
 
     def start_query(self):
         self.querying = True
+        # switching querying back on tries the ECU right away
+        self.breaker.reset()
         
-    def inverters_off(self):
+    async def post(self, path, data=None):
+        # POST to the ECU web interface, returns the HTTP status and raises when the
+        # ECU rejected the request. The timeout covers the whole request so a hung
+        # ECU web server can't hold us up
+        url = 'http://' + str(self.ipaddr) + '/index.php/' + path
         headers = {'X-Requested-With': 'XMLHttpRequest'}
-        url = 'http://'+ str(WiFiSet.ipaddr) + '/index.php/configuration/set_switch_all_off'
+        timeout = aiohttp.ClientTimeout(total=HTTP_TIMEOUT)
+        async with self.session.post(url, headers=headers, data=data, timeout=timeout, raise_for_status=True) as response:
+            return response.status
+
+    async def inverters_off(self):
         try:
-            get_url = requests.post(url, headers=headers)
+            status = await self.post('configuration/set_switch_all_off')
             self.inverters_online = False
-            _LOGGER.debug(f"Response from ECU on switching the inverters off: {str(get_url.status_code)}")
+            self.inverter_states = {}
+            _LOGGER.debug("Response from ECU on switching the inverters off: %s", status)
         except Exception as err:
-            _LOGGER.warning(f"Attempt to switch inverters off failed with error: {err} (This switch is only compatible with ECU-R pro and ECU-C type ECU's)")
+            _LOGGER.warning(f"Attempt to switch inverters off failed with error: {err!r} (This switch is only compatible with ECU-R pro and ECU-C type ECU's)")
 
-    def inverters_on(self):
-        headers = {'X-Requested-With': 'XMLHttpRequest'}
-        url = 'http://'+ str(WiFiSet.ipaddr) + '/index.php/configuration/set_switch_all_on'
+    def has_web_control(self):
+        # only ECU-C and ECU-R pro (with sunspec) can be controlled through their web interface
+        ecu_id = self.ecu.ecu_id or ""
+        return (ecu_id[0:3] == "215") or (ecu_id[0:4] == "2162")
+
+    def inverter_on(self, uid):
+        return self.inverter_states.get(uid, self.inverters_online)
+
+    async def switch_inverters(self, states):
+        # a single request for a batch of inverters, every id is the inverter uid
+        # followed by 1 to switch it on or 2 to switch it off
+        data = [('ids[]', f"{uid}{1 if on else 2}") for uid, on in states.items()]
+        status = await self.post('configuration/set_switch_state', data)
+        self.inverter_states.update(states)
+        _LOGGER.debug("Response from ECU on switching %d inverters: %s", len(states), status)
+
+    async def limit_export(self, export, inverters):
+        # switch inverters for a grid meter reading, returns the uids of the ones switched.
+        # Readings coming in while the switches are being sent are skipped
+        if self.limiter is None or self.limit_lock.locked():
+            return set()
+        async with self.limit_lock:
+            now = time.monotonic()
+            switches = self.limiter.decide(export, inverters, self.inverter_on, now)
+            if not switches:
+                return set()
+            _LOGGER.info("Exporting %s W with a limit of %s W, switching inverters %s", export, self.limiter.limit,
+                ", ".join(f"{uid} {'on' if on else 'off'}" for uid, on in switches.items()))
+            results = await asyncio.gather(*(self.commands.set_state(uid, on) for uid, on in switches.items()),
+                return_exceptions=True)
+            done = {uid: on for (uid, on), result in zip(switches.items(), results)
+                    if not isinstance(result, BaseException)}
+            if done:
+                self.limiter.switched(done, inverters, now)
+                self.save_curtailed()
+            if len(done) < len(switches):
+                error = next(result for result in results if isinstance(result, BaseException))
+                _LOGGER.warning(f"Switching inverters to limit the export failed with error: {error!r}")
+                self.limiter.failed(now)
+            return set(done)
+
+    async def release_curtailed(self):
+        # switch every inverter the export limit turned off back on, the ones that
+        # fail are remembered and tried again at the next setup or stop
+        curtailed = self.curtailed_inverters()
+        if not curtailed:
+            return
         try:
-            get_url = requests.post(url, headers=headers)
+            await self.switch_inverters({uid: True for uid in curtailed})
+            _LOGGER.info("Switched inverters %s back on after limiting the export", ", ".join(curtailed))
+            self.curtailed_before = {}
+        except Exception as err:
+            _LOGGER.warning(f"Switching inverters back on after limiting the export failed with error: {err!r}")
+            self.curtailed_before = curtailed
+        if self.limiter is not None:
+            self.limiter.curtailed = {}
+        self.save_curtailed()
+
+    async def stop_limiting(self):
+        # leave no inverter switched off by the export limit behind, the lock keeps
+        # meter readings from switching inverters off again meanwhile
+        async with self.limit_lock:
+            await self.release_curtailed()
+            self.limiter = None
+
+    async def inverters_on(self):
+        try:
+            status = await self.post('configuration/set_switch_all_on')
             self.inverters_online = True
-            _LOGGER.debug(f"Response from ECU on switching the inverters on: {str(get_url.status_code)}")
+            self.inverter_states = {}
+            _LOGGER.debug("Response from ECU on switching the inverters on: %s", status)
         except Exception as err:
-            _LOGGER.warning(f"Attempt to switch inverters on failed with error: {err} (This switch is only compatible with ECU-R pro and ECU-C type ECU's)")
+            _LOGGER.warning(f"Attempt to switch inverters on failed with error: {err!r} (This switch is only compatible with ECU-R pro and ECU-C type ECU's)")
 
-    def use_cached_data(self, msg):
+    async def use_cached_data(self, msg):
         # we got invalid data, so we need to pull from cache
         self.error_msg = msg
         self.cache_count += 1
+        self.consecutive_failures += 1
+        self.cache_hits += 1
         self.data_from_cache = True
+        delay = self.breaker.failure(time.monotonic())
+        if delay is not None:
+            _LOGGER.warning(f"ECU at {self.ipaddr} is not answering, next attempt in {delay:.0f} seconds")
 
-        if self.cache_count == WiFiSet.cache:
-            _LOGGER.warning(f"Communication with the ECU failed after {WiFiSet.cache} repeated attempts.")
-            data = {'SSID': WiFiSet.ssid, 'channel': 0, 'method': 2, 'psk_wep': '', 'psk_wpa': WiFiSet.wpa}
-            _LOGGER.debug(f"Data sent with URL: {data}")
+        if self.cache_count == self.cache:
+            _LOGGER.warning(f"Communication with the ECU failed after {self.cache} repeated attempts.")
+            data = {'SSID': self.ssid, 'channel': 0, 'method': 2, 'psk_wep': '', 'psk_wpa': self.wpa}
+            _LOGGER.debug("Data sent with URL: %s", data)
             # Determine ECU type to decide ECU restart (for ECU-C and ECU-R with sunspec only)
-            if (self.cached_data.get("ecu_id", None)[0:3] == "215") or (self.cached_data.get("ecu_id", None)[0:4] == "2162"):
-                url = 'http://' + str(WiFiSet.ipaddr) + '/index.php/management/set_wlan_ap'
-                headers = {'X-Requested-With': 'XMLHttpRequest'}
+            if self.has_web_control():
                 try:
-                    get_url = requests.post(url, headers=headers, data=data)
-                    _LOGGER.debug(f"Response from ECU on restart: {str(get_url.status_code)}")
+                    status = await self.post('management/set_wlan_ap', data)
+                    _LOGGER.debug("Response from ECU on restart: %s", status)
                     self.ecu_restarting = True
                 except Exception as err:
-                    _LOGGER.warning(f"Attempt to restart ECU failed with error: {err}. Querying is stopped automatically.")
-                    self.querying = False
+                    _LOGGER.warning(f"Attempt to restart ECU failed with error: {err!r}. Querying resumes automatically once the ECU answers again.")
             else:
                 # Older ECU-R models starting with 2160
-                _LOGGER.warning("Try manually power cycling the ECU. Querying is stopped automatically, turn switch back on after restart of ECU.")
-                self.querying = False
+                _LOGGER.warning("Try manually power cycling the ECU. Querying resumes automatically once the ECU answers again.")
             
-        if self.cached_data.get("ecu_id", None) == None:
-            _LOGGER.debug(f"Cached data {self.cached_data}")
+        if self.cached_data is None or self.cached_data.ecu_id == None:
+            _LOGGER.debug("Cached data %s", self.cached_data)
             raise UpdateFailed(f"Unable to get correct data from ECU, and no cached data. See log for details, and try power cycling the ECU.")
         return self.cached_data
 
-    def update(self):
-        data = {}
+    def snapshot_changes(self, data):
+        # entity keys whose value changed since the previous snapshot, None means
+        # every entity has to write because an attribute they all share changed
+        attributes = (data.ecu_id, data.timestamp, self.ecu.firmware, self.ecu.timezone)
+        old = self.previous_data
+        if old is None or attributes != self.previous_attributes:
+            self.previous_attributes = attributes
+            return None
+
+        changed = {field for field, value, old_value in zip(EcuSnapshot._fields, data, old)
+                   if field != "inverters" and value != old_value}
+        if data.inverters is old.inverters:
+            # the socket reused the decoded inverters, the ECU sent the same frames
+            return changed
+        for uid, inv in data.inverters.items():
+            old_inv = old.inverters.get(uid) or NO_READING
+            if inv == old_inv:
+                continue
+            for field, value, old_value in zip(InverterReading._fields, inv, old_inv):
+                if field in ("power", "voltage"):
+                    # power and voltage sensors each follow a single channel
+                    for index in range(max(len(value), len(old_value))):
+                        if value[index:index + 1] != old_value[index:index + 1]:
+                            changed.add((uid, field, index))
+                elif value != old_value:
+                    changed.add((uid, field))
+        return changed
+
+    async def start_export(self, exporter):
+        await self.stop_export()
+        loop = asyncio.get_running_loop()
+        async with self.export_lock:
+            await loop.run_in_executor(None, exporter.open)
+            self.exporter = exporter
+        _LOGGER.info("Exporting the readings of ECU %s to %s", self.ecu.ecu_id, exporter.path)
+        if self.cached_data is not None and self.history.last_timestamp == self.cached_data.timestamp:
+            # start with the readings we already have
+            await self.export(self.cached_data)
+
+    async def export(self, data):
+        # the file is written in the executor, the lock keeps a stop from closing it halfway
+        loop = asyncio.get_running_loop()
+        async with self.export_lock:
+            if self.exporter is None:
+                return
+            try:
+                await loop.run_in_executor(None, self.exporter.write, data)
+                return
+            except Exception as err:
+                _LOGGER.warning(f"Exporting readings to {self.exporter.path} failed, export stopped: {err}")
+        await self.stop_export()
+
+    async def stop_export(self):
+        loop = asyncio.get_running_loop()
+        async with self.export_lock:
+            exporter, self.exporter = self.exporter, None
+            if exporter is None:
+                return
+            try:
+                await loop.run_in_executor(None, exporter.close)
+            except Exception as err:
+                _LOGGER.warning(f"Closing export file {exporter.path} failed: {err}")
+
+    def query_due(self, query, interval, now):
+        # a failed query has no new read time, so it is tried again on the next poll
+        read_at = self.ecu.read_at.get(query)
+        return read_at is None or now - read_at >= interval - QUERY_CADENCE_SLACK
+
+    def inverters_due_in(self):
+        # seconds until query_due lets the inverter query run again
+        read_at = self.ecu.read_at.get("inverters")
+        if read_at is None:
+            return 0
+        return read_at + self.inverter_interval - QUERY_CADENCE_SLACK - time.monotonic()
+
+    def has_changed(self, key):
+        return self.changed is None or key in self.changed
+
+    def record_poll(self, duration):
+        self.poll_duration = round(duration, 3)
+        poll = {
+            "time": dt.datetime.now().isoformat(timespec="seconds"),
+            "duration": self.poll_duration,
+            "from_cache": self.data_from_cache,
+        }
+        poll.update(self.ecu.timings)
+        self.poll_history.append(poll)
+
+    def dump_data(self):
+        return {
+            "querying": self.querying,
+            "data_from_cache": self.data_from_cache,
+            "cache_count": self.cache_count,
+            "consecutive_failures": self.consecutive_failures,
+            "cache_hits": self.cache_hits,
+            "poll_duration": self.poll_duration,
+            "poll_history": list(self.poll_history),
+            "breaker": self.breaker.dump_data(time.monotonic()),
+            "export_limit": None if self.limiter is None else self.limiter.dump_data(),
+        }
+
+    async def update(self):
+        # nothing changed unless we get a snapshot, a failed update only affects availability
+        self.changed = set()
+        self.contacted = False
+        start = time.monotonic()
+        try:
+            data = await self.fetch_data()
+        finally:
+            if self.contacted:
+                self.record_poll(time.monotonic() - start)
+        data = data._replace(poll_duration=self.poll_duration,
+            consecutive_failures=self.consecutive_failures,
+            cache_hits=self.cache_hits)
+        self.changed = self.snapshot_changes(data)
+        self.previous_data = data
+        return data
+
+    async def fetch_data(self):
         # if we aren't actively quering data, pull data form the cache
         # this is so we can stop querying after sunset
         if not self.querying:
             _LOGGER.debug("Not querying ECU due to query=False")
-            data = self.cached_data
+            self.cache_hits += 1
             self.data_from_cache = True
-            data["data_from_cache"] = self.data_from_cache
-            data["querying"] = self.querying
-            return self.cached_data
+            if self.cached_data is None:
+                raise UpdateFailed("Not querying the ECU and no cached data")
+            return self.cached_data._replace(data_from_cache=self.data_from_cache, querying=self.querying)
+
+        if not self.breaker.allow(time.monotonic()):
+            # the ECU isn't answering, leave it alone until the breaker lets us try again
+            _LOGGER.debug("Not querying ECU %s until the circuit breaker closes", self.ecu.ecu_id)
+            self.cache_hits += 1
+            self.data_from_cache = True
+            if self.cached_data is None:
+                raise UpdateFailed("The ECU is not answering and there is no cached data")
+            return self.cached_data._replace(data_from_cache=self.data_from_cache,
+                querying=self.querying, restart_ecu=self.ecu_restarting)
 
         _LOGGER.debug("Querying ECU...")
+        self.contacted = True
         try:
-            data = self.ecu.query_ecu()
+            if self.breaker.state == BREAKER_HALF_OPEN:
+                # see if the ECU accepts a connection before sending it the queries,
+                # a failed probe mustn't record the phase timings of the previous poll
+                self.ecu.timings = {}
+                await self.ecu.probe(PROBE_TIMEOUT)
+            now = time.monotonic()
+            data = await self.ecu.query_ecu(self.query_due("inverters", self.inverter_interval, now),
+                self.query_due("signal", self.signal_interval, now))
             _LOGGER.debug("Got data from ECU")
+            for query, err in self.ecu.failed_queries.items():
+                if err != 'timed out':
+                    _LOGGER.warning(f"Using the {query} data of {self.ecu.freshness.get(query)} from ECU {data.ecu_id}, the query failed: {err}")
 
             # we got good results, so we store it and set flags about our cache state
-            if data["ecu_id"] != None:
+            if data.ecu_id != None:
                 self.cached_data = data
                 self.cache_count = 0
+                self.consecutive_failures = 0
                 self.data_from_cache = False
                 self.ecu_restarting = False
                 self.error_message = ""
+                if self.breaker.success():
+                    _LOGGER.info("ECU %s is answering again", data.ecu_id)
+                if self.history.record(data) and self.exporter is not None:
+                    await self.export(data)
+                if self.store is not None:
+                    self.store.async_delay_save(self.snapshot_to_store, SNAPSHOT_SAVE_DELAY)
             else:
                 msg = f"Using cached data from last successful communication from ECU. Error: no ecu_id returned"
                 _LOGGER.warning(msg)
-                data = self.use_cached_data(msg)
+                data = await self.use_cached_data(msg)
 
         except APSystemsInvalidData as err:
             msg = f"Using cached data from last successful communication from ECU. Invalid data error: {err}"
             if str(err) != 'timed out':
                 _LOGGER.warning(msg)
-            data = self.use_cached_data(msg)
+            data = await self.use_cached_data(msg)
 
         except Exception as err:
             msg = f"Using cached data from last successful communication from ECU. Exception error: {err}"
             _LOGGER.warning(msg)
-            data = self.use_cached_data(msg)
+            data = await self.use_cached_data(msg)
 
-        data["data_from_cache"] = self.data_from_cache
-        data["querying"] = self.querying
-        data["restart_ecu"] = self.ecu_restarting
-        _LOGGER.debug(f"Returning {data}")
-        if data.get("ecu_id", None) == None:
+        data = data._replace(data_from_cache=self.data_from_cache,
+            querying=self.querying,
+            restart_ecu=self.ecu_restarting)
+        _LOGGER.debug("Returning %s", data)
+        if data.ecu_id == None:
             raise UpdateFailed(f"Somehow data doesn't contain a valid ecu_id")
         return data
 
 async def update_listener(hass, config):
     # Handle options update being triggered by config entry options updates
-    _LOGGER.debug(f"Configuration updated: {config.as_dict()}")
-    ecu = ECUR(config.data["host"],
-               config.data["SSID"],
-               config.data["WPA-PSK"],
-               config.data["CACHE"],
-               config.data["stop_graphs"]
-              )
+    _LOGGER.debug("Configuration updated: %s", config.as_dict())
+    # every ECU keeps its own settings, reload the entry so they are applied
+    await hass.config_entries.async_reload(config.entry_id)
+
+def setup_wire_trace(hass, config, ecu):
+    # raw frames are handed to a listener thread through a queue, so writing
+    # and rotating the trace files never happens on the event loop. Next to the
+    # readable log the frames go to a binary capture for tools/replay_capture.py
+    path = hass.config.path(f"{DOMAIN}_wire_{config.entry_id}.log")
+    file_handler = RotatingFileHandler(path, maxBytes=WIRE_TRACE_MAX_BYTES, backupCount=WIRE_TRACE_BACKUPS, delay=True)
+    file_handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    capture_path = hass.config.path(f"{DOMAIN}_capture_{config.entry_id}.bin")
+    capture_handler = CaptureHandler(capture_path, CAPTURE_MAX_BYTES)
+    trace_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(trace_queue)
+    listener = QueueListener(trace_queue, file_handler, capture_handler)
+
+    wire_logger = logging.getLogger(f"{__name__}.wire.{config.entry_id}")
+    wire_logger.propagate = False
+    wire_logger.setLevel(logging.INFO)
+    wire_logger.addHandler(queue_handler)
+    listener.start()
+    ecu.ecu.wire_logger = wire_logger
+    _LOGGER.info("Writing raw ECU frames to %s and %s", path, capture_path)
+
+    def stop_wire_trace():
+        ecu.ecu.wire_logger = None
+        wire_logger.removeHandler(queue_handler)
+        listener.stop()
+        file_handler.close()
+        capture_handler.close()
+
+    config.async_on_unload(stop_wire_trace)
+
+def meter_power(state):
+    # grid meter reading in W, positive when exporting
+    if state is None:
+        return None
+    try:
+        power = float(state.state)
+    except ValueError:
+        return None
+    if state.attributes.get("unit_of_measurement") == "kW":
+        power *= 1000
+    return power
+
+def setup_export_limit(hass, config, ecu, coordinator):
+    # follow the grid meter and switch inverters so the export stays under the limit
+    sensor = config.data[CONF_EXPORT_SENSOR]
+    if not ecu.has_web_control():
+        _LOGGER.warning(f"Can't limit the export with {sensor}, switching inverters is only compatible with ECU-R pro and ECU-C type ECU's")
+        return
+    ecu.limiter = ExportLimiter(config.data.get(CONF_EXPORT_LIMIT, 0), EXPORT_HYSTERESIS, EXPORT_DWELL)
+    _LOGGER.info("Limiting the export measured by %s to %s W", sensor, ecu.limiter.limit)
+
+    async def meter_changed(event):
+        export = meter_power(event.data.get("new_state"))
+        if export is None or coordinator.data is None:
+            return
+        switched = await ecu.limit_export(export, coordinator.data.inverters)
+        if switched:
+            # show the new state of these inverter switches, the other entities have nothing new
+            async_dispatcher_send(hass, SIGNAL_INVERTERS_SWITCHED.format(ecu.ecu.ecu_id), switched)
+
+    config.async_on_unload(async_track_state_change_event(hass, [sensor], meter_changed))
 
 async def async_setup_entry(hass, config):
     # Setup the APsystems platform """
     hass.data.setdefault(DOMAIN, {})
+    # one poller shared by all ECUs so their queries don't pile up
+    fleet = hass.data.setdefault(FLEET, FleetPoller())
     host = config.data["host"]
     interval = timedelta(seconds=config.data["scan_interval"])
     # Defaults for new parameters that might not have been set yet from previous integration versions
@@ -172,25 +563,72 @@ async def async_setup_entry(hass, config):
     ssid = config.data.get("SSID", "ECU-WiFi_SSID")
     wpa = config.data.get("WPA-PSK", "myWiFipassword")
     nographs = config.data.get("stop_graphs", False)
-    ecu = ECUR(host, ssid, wpa, cache, nographs)
-    
+    persistent = config.data.get("persistent_connection", False)
+    inverter_interval = config.data.get(CONF_INVERTER_INTERVAL, 0)
+    signal_interval = config.data.get(CONF_SIGNAL_INTERVAL, 0)
+    ecu = ECUR(host, ssid, wpa, cache, nographs, persistent, inverter_interval, signal_interval)
+    if config.data.get(CONF_WIRE_TRACE, False):
+        setup_wire_trace(hass, config, ecu)
+
+    # follow the ECU data refreshes and the sun instead of a fixed interval
+    adaptive = AdaptiveInterval(interval.total_seconds()) if config.data.get(CONF_ADAPTIVE, False) else None
+
+    # local time the inverters were last read, with inverter_interval not every poll reads them
+    inverters_read_at = None
 
     async def do_ecu_update():
-        return await hass.async_add_executor_job(ecu.update)
+        nonlocal inverters_read_at
+        # the first refresh during setup isn't staggered, entities are waiting for it
+        try:
+            data = await fleet.poll(ecu.update, stagger=coordinator.data is not None)
+        except UpdateFailed:
+            coordinator.update_interval = interval
+            raise
+        if adaptive is not None and data.data_from_cache:
+            # a failed poll returns the cached snapshot, its timestamp tells nothing
+            # about the ECU refreshes so don't let the learner see it
+            coordinator.update_interval = interval
+        elif adaptive is not None:
+            # the coordinator picks up the new interval when it schedules the next refresh
+            read_at = (data.freshness or {}).get("inverters")
+            inverters_read = read_at != inverters_read_at
+            inverters_read_at = read_at
+            sun_up = is_up(hass)
+            next_sunrise = None if sun_up else get_astral_event_next(hass, "sunrise")
+            if inverters_read or not sun_up:
+                seconds = adaptive.next_interval(data.timestamp, dt_util.utcnow(), sun_up, next_sunrise, inverters_read)
+            else:
+                # the inverter data is the same as last time, keep the learner out of it
+                # and query the ECU totals on the scan interval until the inverters are due
+                seconds = min(interval.total_seconds(), max(ecu.inverters_due_in(), ADAPTIVE_MIN_INTERVAL))
+            coordinator.update_interval = timedelta(seconds=seconds)
+        return data
 
     coordinator = DataUpdateCoordinator(
             hass,
             _LOGGER,
-            name=DOMAIN,
+            name=f"{DOMAIN} {host}",
             update_method=do_ecu_update,
             update_interval=interval,
     )
+    fleet.register(config.entry_id, interval)
+    config.async_on_unload(lambda: fleet.unregister(config.entry_id))
+
+    ecu.store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{config.entry_id}")
+    ecu.session = async_get_clientsession(hass)
+    snapshot = ecu.restore_snapshot(await ecu.store.async_load())
 
-    hass.data[DOMAIN] = {
+    hass.data[DOMAIN][config.entry_id] = {
         "ecu" : ecu,
         "coordinator" : coordinator
     }
-    await coordinator.async_config_entry_first_refresh()
+    if snapshot is None:
+        await coordinator.async_config_entry_first_refresh()
+    else:
+        # set up entities from the stored snapshot and query the ECU in the background
+        _LOGGER.debug("Using stored snapshot of ECU %s until the first query finishes", snapshot.ecu_id)
+        coordinator.async_set_updated_data(snapshot)
+        hass.async_create_task(coordinator.async_refresh())
 
     device_registry = dr.async_get(hass)
 
@@ -204,19 +642,30 @@ async def async_setup_entry(hass, config):
         sw_version=ecu.ecu.firmware,
     )
 
-    inverters = coordinator.data.get("inverters", {})
+    inverters = coordinator.data.inverters
     for uid,inv_data in inverters.items():
-        model = inv_data.get("model", "Inverter")
         device_registry.async_get_or_create(
             config_entry_id=config.entry_id,
             identifiers={(DOMAIN, f"inverter_{uid}")},
             manufacturer="APSystems",
             suggested_area="Roof",
             name=f"Inverter {uid}",
-            model=inv_data.get("model")
+            model=inv_data.model
         )
     await hass.config_entries.async_forward_entry_setups(config, PLATFORMS)
+    if ecu.has_web_control():
+        # Home Assistant doesn't unload the entry when it stops, switch the
+        # curtailed inverters back on there and after a restart
+        await ecu.release_curtailed()
+
+        async def ha_stopping(event):
+            await ecu.stop_limiting()
+
+        config.async_on_unload(hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, ha_stopping))
+    if config.data.get(CONF_EXPORT_SENSOR):
+        setup_export_limit(hass, config, ecu, coordinator)
     config.async_on_unload(config.add_update_listener(update_listener))
+    async_setup_services(hass)
     return True
 
 async def async_remove_config_entry_device(hass, config, device_entry) -> bool:
@@ -231,11 +680,19 @@ async def async_remove_config_entry_device(hass, config, device_entry) -> bool:
     else:
         return False
 
+async def async_remove_entry(hass, config):
+    # forget the stored snapshot of an ECU that is no longer configured
+    await Store(hass, STORAGE_VERSION, f"{DOMAIN}.{config.entry_id}").async_remove()
+
 async def async_unload_entry(hass, config):
     unload_ok = await hass.config_entries.async_unload_platforms(config, PLATFORMS)
-    coordinator = hass.data[DOMAIN].get("coordinator")
-    ecu = hass.data[DOMAIN].get("ecu")
+    ecu = hass.data[DOMAIN][config.entry_id].get("ecu")
     ecu.stop_query()
+    ecu.commands.cancel()
+    await ecu.stop_limiting()
+    await ecu.stop_export()
     if unload_ok:
         hass.data[DOMAIN].pop(config.entry_id)
+        if not hass.data[DOMAIN]:
+            async_unload_services(hass)
     return unload_ok
@@ -0,0 +1,97 @@
+import logging
+from datetime import datetime, timezone
+
+_LOGGER = logging.getLogger(__name__)
+
+# the ECU collects new inverter data about every 5 minutes
+ECU_DATA_PERIOD = 300
+# shortest refresh period we believe, anything below is the ECU catching up
+ECU_MIN_DATA_PERIOD = 60
+# poll this long after the ECU is expected to have new data
+ADAPTIVE_MARGIN = 20
+# never poll more often than this, also the first retry when data was stale
+ADAPTIVE_MIN_INTERVAL = 30
+
+# works out when to poll next from the timestamp of the ECU data, so we
+# query right after the ECU refreshed instead of on a fixed interval
+class AdaptiveInterval():
+    def __init__(self, max_interval):
+        self.max_interval = max_interval
+        self.period = None
+        self.last_timestamp = None
+        self.last_poll = None
+        # the ECU clock runs in its own timezone and drifts, every refresh we see
+        # tells us the offset to our clock lies between two bounds, this is the
+        # narrowest (low, high) all of them agree on
+        self.offset_bounds = None
+        self.stale_polls = 0
+
+    def parse_timestamp(self, timestamp):
+        # the ECU timestamp has no timezone, treat it as UTC and let the offset absorb the difference
+        return datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+
+    def estimate_offset(self, low, high):
+        # the refresh happened after our previous poll and before now, so the
+        # ECU clock offset is between low and high. Most refreshes only give the
+        # wide bound of a whole period, so the estimate is narrowed and kept
+        # instead of forgetting the few tight bounds seen after stale polls
+        if self.offset_bounds is None:
+            self.offset_bounds = (low, high)
+        else:
+            known_low, known_high = self.offset_bounds
+            if low <= known_high and high >= known_low:
+                self.offset_bounds = (max(low, known_low), min(high, known_high))
+            elif low - known_high < ADAPTIVE_MARGIN and known_low - high < ADAPTIVE_MARGIN:
+                # the clocks drifted a little, move the estimate just inside the new bound
+                width = known_high - known_low
+                if low > known_high:
+                    self.offset_bounds = (low, min(high, low + width))
+                else:
+                    self.offset_bounds = (max(low, high - width), high)
+            else:
+                # the ECU clock jumped, daylight saving time for example, start over
+                self.offset_bounds = (low, high)
+        return (self.offset_bounds[0] + self.offset_bounds[1]) / 2
+
+    def next_interval(self, timestamp, now, sun_up=True, next_sunrise=None, inverters_read=True):
+        # seconds until the next poll, now is an aware datetime in UTC. During the
+        # day only polls that read the inverters may be passed, the timestamp
+        # comes from the inverter data
+        previous_poll = self.last_poll
+        if inverters_read:
+            # a poll that skipped the inverter query can't have seen a refresh, so it
+            # isn't a lower bound for the next one
+            self.last_poll = now
+        if not sun_up and next_sunrise is not None:
+            # nothing to collect at night, come back when the sun is up
+            self.stale_polls = 0
+            return max((next_sunrise - now).total_seconds() + ADAPTIVE_MARGIN, ADAPTIVE_MIN_INTERVAL)
+
+        try:
+            current = self.parse_timestamp(timestamp)
+        except (TypeError, ValueError):
+            return self.max_interval
+
+        if timestamp == self.last_timestamp:
+            # the ECU hasn't refreshed yet when we expected it to, back off
+            self.stale_polls += 1
+            return min(ADAPTIVE_MIN_INTERVAL * 2 ** (self.stale_polls - 1), self.max_interval)
+
+        if self.last_timestamp is not None:
+            step = (current - self.parse_timestamp(self.last_timestamp)).total_seconds()
+            # we may have missed refreshes, so the smallest step is the best guess of the period
+            if step >= ECU_MIN_DATA_PERIOD and (self.period is None or step < self.period):
+                self.period = step
+        self.last_timestamp = timestamp
+        self.stale_polls = 0
+        period = self.period or ECU_DATA_PERIOD
+
+        # our clock = ECU clock + offset, lag is how far behind the ECU timestamp is
+        lag = (now - current).total_seconds()
+        since_previous = (now - previous_poll).total_seconds() if previous_poll else period
+        offset = self.estimate_offset(lag - since_previous, lag)
+
+        # the next refresh is due at current + period on the ECU clock
+        wait = period + offset + ADAPTIVE_MARGIN - lag
+        _LOGGER.debug("ECU data is %.0f seconds old, refresh period %.0f, next poll in %.0f seconds", lag, period, wait)
+        return min(max(wait, ADAPTIVE_MIN_INTERVAL), self.max_interval)
@@ -9,6 +9,7 @@ from homeassistant.helpers.update_coordinator import (
     CoordinatorEntity,
 )
 
+from .entity import APSystemsCoordinatorEntity
 from .const import (
     DOMAIN,
     RELOAD_ICON,
@@ -20,8 +21,8 @@ _LOGGER = logging.getLogger(__name__)
 
 async def async_setup_entry(hass, config, add_entities, discovery_info=None):
 
-    ecu = hass.data[DOMAIN].get("ecu")
-    coordinator = hass.data[DOMAIN].get("coordinator")
+    ecu = hass.data[DOMAIN][config.entry_id].get("ecu")
+    coordinator = hass.data[DOMAIN][config.entry_id].get("coordinator")
 
     sensors = [
         APSystemsECUBinarySensor(coordinator, ecu, "data_from_cache", 
@@ -32,7 +33,7 @@ async def async_setup_entry(hass, config, add_entities, discovery_info=None):
     add_entities(sensors)
 
 
-class APSystemsECUBinarySensor(CoordinatorEntity, BinarySensorEntity):
+class APSystemsECUBinarySensor(APSystemsCoordinatorEntity, BinarySensorEntity):
 
     def __init__(self, coordinator, ecu, field, label=None, devclass=None, icon=None):
 
@@ -49,6 +50,7 @@ class APSystemsECUBinarySensor(CoordinatorEntity, BinarySensorEntity):
 
         self._name = f"ECU {self._label}"
         self._state = None
+        self._change_key = field
 
     @property
     def unique_id(self):
@@ -60,7 +62,7 @@ class APSystemsECUBinarySensor(CoordinatorEntity, BinarySensorEntity):
 
     @property
     def is_on(self):
-        return self.coordinator.data.get(self._field)
+        return getattr(self.coordinator.data, self._field)
 
     @property
     def icon(self):
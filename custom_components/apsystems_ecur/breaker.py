@@ -0,0 +1,62 @@
+import logging
+import random
+
+_LOGGER = logging.getLogger(__name__)
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+# stops querying an ECU that keeps failing. After threshold failures in a row
+# the breaker opens and the ECU is left alone for a delay that doubles every
+# time it opens again, with jitter so several ECUs don't come back in step.
+# When the delay is over the breaker is half open, the next poll probes the
+# ECU and a single failure opens it again, a good query closes it
+class CircuitBreaker():
+    def __init__(self, threshold, base_delay, max_delay):
+        self.threshold = max(threshold, 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        # times the breaker opened since the last good query
+        self.trips = 0
+        self.retry_at = None
+
+    def allow(self, now):
+        # whether to query the ECU now, moves an open breaker to half open once the delay is over
+        if self.state == BREAKER_OPEN and now >= self.retry_at:
+            self.state = BREAKER_HALF_OPEN
+        return self.state != BREAKER_OPEN
+
+    def success(self):
+        # returns whether the ECU came back after the breaker opened
+        recovered = self.trips > 0
+        self.reset()
+        return recovered
+
+    def failure(self, now):
+        # returns the seconds until the next attempt when the breaker opens, None otherwise
+        self.failures += 1
+        if self.state != BREAKER_HALF_OPEN and self.failures < self.threshold:
+            return None
+        self.trips += 1
+        delay = min(self.base_delay * 2 ** (self.trips - 1), self.max_delay)
+        delay = random.uniform(delay / 2, delay)
+        self.state = BREAKER_OPEN
+        self.retry_at = now + delay
+        return delay
+
+    def reset(self):
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.retry_at = None
+
+    def dump_data(self, now):
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "trips": self.trips,
+            "retry_in": None if self.retry_at is None else round(max(self.retry_at - now, 0), 1),
+        }
@@ -0,0 +1,98 @@
+import logging
+import mmap
+import os
+import struct
+
+_LOGGER = logging.getLogger(__name__)
+
+# Raw frame capture file, used to replay what an ECU sent through the parser
+# (see tools/replay_capture.py). The file starts with CAPTURE_MAGIC followed by
+# records of a CAPTURE_RECORD header and the frame bytes:
+#   time    float64 seconds since the epoch
+#   kind    b"s" command sent, b"r" reply received, b"e" partial reply of a failed read
+#   length  uint32 number of frame bytes that follow
+CAPTURE_MAGIC = b"APSCAP1\n"
+CAPTURE_RECORD = struct.Struct(">dcI")
+CAPTURE_KINDS = {"send": b"s", "recv": b"r", "error": b"e"}
+
+# logging handler writing the frames of the wire logger records to a capture
+# file, it runs on the wire trace QueueListener thread so the file is never
+# written from the event loop
+class CaptureHandler(logging.Handler):
+    def __init__(self, path, max_bytes):
+        super().__init__()
+        self.path = path
+        self.max_bytes = max_bytes
+        self.file = None
+        self.full = False
+
+    def emit(self, record):
+        frame = getattr(record, "frame", None)
+        kind = CAPTURE_KINDS.get(getattr(record, "direction", None))
+        if frame is None or kind is None or self.full:
+            return
+        try:
+            if self.file is None:
+                self.file = open(self.path, "ab")
+                if self.file.tell() == 0:
+                    self.file.write(CAPTURE_MAGIC)
+            if self.file.tell() + CAPTURE_RECORD.size + len(frame) > self.max_bytes:
+                # append only, so stop instead of rotating
+                self.full = True
+                _LOGGER.warning("Capture file %s reached %d bytes, no longer capturing frames", self.path, self.max_bytes)
+                return
+            self.file.write(CAPTURE_RECORD.pack(record.created, kind, len(frame)) + frame)
+            self.file.flush()
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        super().close()
+
+def read_capture(path, use_mmap=True):
+    # yields (time, kind, frame) for every record, with use_mmap the frames are
+    # memoryviews into the mapped file and only valid while iterating
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        if use_mmap:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(data)
+        else:
+            data = view = file.read()
+        try:
+            if bytes(view[:len(CAPTURE_MAGIC)]) != CAPTURE_MAGIC:
+                raise ValueError(f"{path} is not a frame capture file")
+            location = len(CAPTURE_MAGIC)
+            while location + CAPTURE_RECORD.size <= len(view):
+                when, kind, length = CAPTURE_RECORD.unpack_from(view, location)
+                location += CAPTURE_RECORD.size
+                if location + length > len(view):
+                    # the last record was cut short, Home Assistant stopped while writing it
+                    break
+                yield when, kind, view[location:location + length]
+                location += length
+        finally:
+            if use_mmap:
+                try:
+                    view.release()
+                    data.close()
+                except BufferError:
+                    # frames are still referenced, the mapping goes away with them
+                    pass
+
+def capture_sessions(records):
+    # group the records into polls, every poll starts by sending the ECU query,
+    # yields lists of (time, kind, frame) with the frames copied to bytes
+    session = []
+    for when, kind, frame in records:
+        frame = bytes(frame)
+        if kind == b"s" and frame.startswith(b"APS1100160001") and session:
+            yield session
+            session = []
+        session.append((when, kind, frame))
+    if session:
+        yield session
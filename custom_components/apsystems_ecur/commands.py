@@ -0,0 +1,67 @@
+import asyncio
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+# collects on/off commands for single inverters and sends them in batches, so an
+# automation switching many inverters at once results in a few ECU requests
+# instead of one per inverter. A newer command for an inverter replaces a
+# pending one, send is a coroutine taking a dict of uid to True (on) or False (off)
+class InverterCommandQueue():
+    def __init__(self, send, delay, batch_size):
+        self.send = send
+        self.delay = delay
+        self.batch_size = batch_size
+        self.pending = {}
+        self.waiters = {}
+        self.task = None
+
+    async def set_state(self, uid, on):
+        # returns once the batch holding this command was sent, raises when it failed
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending[uid] = on
+        self.waiters.setdefault(uid, []).append(future)
+        if self.task is None:
+            self.task = loop.create_task(self.flush())
+        return await future
+
+    async def flush(self):
+        # give the other commands of an automation the time to come in
+        await asyncio.sleep(self.delay)
+        pending, self.pending = self.pending, {}
+        waiters, self.waiters = self.waiters, {}
+        self.task = None
+        commands = list(pending.items())
+        _LOGGER.debug("Sending %d inverter commands in batches of %d", len(commands), self.batch_size)
+        try:
+            for start in range(0, len(commands), self.batch_size):
+                batch = dict(commands[start:start + self.batch_size])
+                try:
+                    await self.send(batch)
+                    error = None
+                except Exception as err:
+                    error = err
+                for uid in batch:
+                    for future in waiters[uid]:
+                        if future.done():
+                            continue
+                        if error is None:
+                            future.set_result(None)
+                        else:
+                            future.set_exception(error)
+        finally:
+            # cancelled halfway, don't leave anyone waiting for the batches we didn't send
+            for futures in waiters.values():
+                for future in futures:
+                    future.cancel()
+
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        for futures in self.waiters.values():
+            for future in futures:
+                future.cancel()
+        self.pending = {}
+        self.waiters = {}
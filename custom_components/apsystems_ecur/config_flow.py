@@ -5,12 +5,13 @@ from datetime import timedelta
 from homeassistant.core import callback
 from .APSystemsSocket import APSystemsSocket, APSystemsInvalidData
 from homeassistant import config_entries, exceptions
+from homeassistant.data_entry_flow import AbortFlow
 from homeassistant.const import CONF_HOST, CONF_SCAN_INTERVAL
 import homeassistant.helpers.config_validation as cv
 
 _LOGGER = logging.getLogger(__name__)
 
-from .const import DOMAIN, CONF_SSID, CONF_WPA_PSK, CONF_CACHE, CONF_STOP_GRAPHS
+from .const import DOMAIN, CONF_SSID, CONF_WPA_PSK, CONF_CACHE, CONF_STOP_GRAPHS, CONF_PERSISTENT, CONF_WIRE_TRACE, CONF_ADAPTIVE, CONF_EXPORT_SENSOR, CONF_EXPORT_LIMIT, CONF_INVERTER_INTERVAL, CONF_SIGNAL_INTERVAL
 
 STEP_USER_DATA_SCHEMA = vol.Schema({vol.Required(CONF_HOST): str,
                                     vol.Required(CONF_SCAN_INTERVAL, default=300): int,
@@ -18,6 +19,13 @@ STEP_USER_DATA_SCHEMA = vol.Schema({vol.Required(CONF_HOST): str,
                                     vol.Optional(CONF_SSID, default="ECU-WIFI_local"): str,
                                     vol.Optional(CONF_WPA_PSK, default="default"): str,
                                     vol.Optional(CONF_STOP_GRAPHS, default=False): bool,
+                                    vol.Optional(CONF_PERSISTENT, default=False): bool,
+                                    vol.Optional(CONF_ADAPTIVE, default=False): bool,
+                                    vol.Optional(CONF_INVERTER_INTERVAL, default=0): int,
+                                    vol.Optional(CONF_SIGNAL_INTERVAL, default=0): int,
+                                    vol.Optional(CONF_EXPORT_SENSOR, default=""): str,
+                                    vol.Optional(CONF_EXPORT_LIMIT, default=0): int,
+                                    vol.Optional(CONF_WIRE_TRACE, default=False): bool,
                                     })
 
 @config_entries.HANDLERS.register(DOMAIN)
@@ -38,16 +46,21 @@ class APSsystemsFlowHandler(config_entries.ConfigFlow):
         _LOGGER.debug("User input is not empty, processing input")
         try:
             _LOGGER.debug("Initial attempt to query ECU")
-            ap_ecu = APSystemsSocket(user_input["host"], user_input["stop_graphs"])
-            test_query = await self.hass.async_add_executor_job(ap_ecu.query_ecu)
-            ecu_id = test_query.get("ecu_id", None)
+            ap_ecu = APSystemsSocket(user_input["host"], user_input["stop_graphs"], persistent=user_input.get(CONF_PERSISTENT, False))
+            test_query = await ap_ecu.query_ecu()
+            ecu_id = test_query.ecu_id
             if ecu_id != None:
+                # several ECUs can be configured, but each one only once
+                await self.async_set_unique_id(ecu_id)
+                self._abort_if_unique_id_configured()
                 return self.async_create_entry(title=f"ECU: {ecu_id}", data=user_input)
             else:
                 errors["host"] = "no_ecuid"
         except APSystemsInvalidData as err:
             _LOGGER.exception(f"APSystemsInvalidData exception: {err}")
             errors["host"] = "cannot_connect"
+        except AbortFlow:
+            raise
         except Exception as err:
             _LOGGER.exception(f"Unknown error occurred during setup: {err}")
             errors["host"] = "unknown"
@@ -79,19 +92,27 @@ class APSsystemsOptionsFlowHandler(config_entries.OptionsFlow):
                         description={"suggested_value": self.config_entry.data.get(CONF_SSID)}): str,
                     vol.Optional(CONF_WPA_PSK, default="myWiFipassword", 
                         description={"suggested_value": self.config_entry.data.get(CONF_WPA_PSK)}): str,
-                    vol.Optional(CONF_STOP_GRAPHS, default=self.config_entry.data.get(CONF_STOP_GRAPHS)): bool
+                    vol.Optional(CONF_STOP_GRAPHS, default=self.config_entry.data.get(CONF_STOP_GRAPHS)): bool,
+                    vol.Optional(CONF_PERSISTENT, default=self.config_entry.data.get(CONF_PERSISTENT, False)): bool,
+                    vol.Optional(CONF_ADAPTIVE, default=self.config_entry.data.get(CONF_ADAPTIVE, False)): bool,
+                    vol.Optional(CONF_INVERTER_INTERVAL, default=self.config_entry.data.get(CONF_INVERTER_INTERVAL, 0)): int,
+                    vol.Optional(CONF_SIGNAL_INTERVAL, default=self.config_entry.data.get(CONF_SIGNAL_INTERVAL, 0)): int,
+                    vol.Optional(CONF_EXPORT_SENSOR, default="",
+                        description={"suggested_value": self.config_entry.data.get(CONF_EXPORT_SENSOR)}): str,
+                    vol.Optional(CONF_EXPORT_LIMIT, default=self.config_entry.data.get(CONF_EXPORT_LIMIT, 0)): int,
+                    vol.Optional(CONF_WIRE_TRACE, default=self.config_entry.data.get(CONF_WIRE_TRACE, False)): bool
                     })
             )
         try:
-            ap_ecu = APSystemsSocket(user_input["host"], user_input["stop_graphs"])
+            ap_ecu = APSystemsSocket(user_input["host"], user_input["stop_graphs"], persistent=user_input.get(CONF_PERSISTENT, False))
             _LOGGER.debug("Attempt to query ECU")
-            test_query = await self.hass.async_add_executor_job(ap_ecu.query_ecu)
-            ecu_id = test_query.get("ecu_id", None)
+            test_query = await ap_ecu.query_ecu()
+            ecu_id = test_query.ecu_id
             if ecu_id != None:
                 self.hass.config_entries.async_update_entry(
                 self.config_entry, data=user_input, options=self.config_entry.options
                 )
-                coordinator = self.hass.data[DOMAIN].get("coordinator")
+                coordinator = self.hass.data[DOMAIN][self.config_entry.entry_id].get("coordinator")
                 coordinator.update_interval = timedelta(seconds=self.config_entry.data.get(CONF_SCAN_INTERVAL))
                 return self.async_create_entry(title=f"ECU: {ecu_id}", data={})
             else:
@@ -99,5 +120,5 @@ class APSsystemsOptionsFlowHandler(config_entries.OptionsFlow):
         except APSystemsInvalidData as err:
             errors["host"] = "cannot_connect"
         except Exception as err:
-            _LOGGER.debug(f"Unknown error occurred during setup: {err}")
+            _LOGGER.debug("Unknown error occurred during setup: %s", err)
             errors["host"] = "unknown"
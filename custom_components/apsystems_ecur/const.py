@@ -1,4 +1,6 @@
 DOMAIN = 'apsystems_ecur'
+# hass.data key of the FleetPoller shared by all ECUs, hass.data[DOMAIN] only holds the entries
+FLEET = f"{DOMAIN}_fleet"
 SOLAR_ICON = "mdi:solar-power"
 FREQ_ICON = "mdi:sine-wave"
 SIGNAL_ICON = "mdi:signal"
@@ -6,8 +8,65 @@ RELOAD_ICON = "mdi:reload"
 CACHE_ICON = "mdi:cached"
 RESTART_ICON = "mdi:restart"
 POWER_ICON = "mdi:power"
+TIMER_ICON = "mdi:timer-outline"
+ALERT_ICON = "mdi:alert-circle-outline"
 
 CONF_SSID = "SSID"
 CONF_WPA_PSK = "WPA-PSK"
 CONF_CACHE = "CACHE"
 CONF_STOP_GRAPHS = "stop_graphs"
+CONF_PERSISTENT = "persistent_connection"
+CONF_WIRE_TRACE = "wire_trace"
+CONF_ADAPTIVE = "adaptive_polling"
+CONF_EXPORT_SENSOR = "export_sensor"
+CONF_EXPORT_LIMIT = "export_limit"
+CONF_INVERTER_INTERVAL = "inverter_interval"
+CONF_SIGNAL_INTERVAL = "signal_interval"
+
+# rotating capture file for raw ECU frames when wire tracing is enabled
+WIRE_TRACE_MAX_BYTES = 1024 * 1024
+WIRE_TRACE_BACKUPS = 3
+# the binary capture of the same frames is append only and stops at this size
+CAPTURE_MAX_BYTES = 64 * 1024 * 1024
+
+# at most this many ECUs are queried at the same time
+FLEET_MAX_CONCURRENT = 2
+# random delay added to every staggered poll start, in seconds
+FLEET_JITTER = 5
+# ECUs are spread over their scan interval, but never further apart than this
+FLEET_MAX_SPACING = 30
+
+# seconds a request to the ECU web interface may take, ECU restart and inverter switching
+HTTP_TIMEOUT = 10
+# commands for single inverters are collected this many seconds and sent this many at a time
+COMMAND_BATCH_DELAY = 0.5
+COMMAND_BATCH_SIZE = 20
+# dispatcher signal, formatted with the ECU id, carrying the uids of the inverters
+# the export limit switched so only their switches write their state
+SIGNAL_INVERTERS_SWITCHED = f"{DOMAIN}_inverters_switched_{{}}"
+# export limiting: W under the limit needed before an inverter is switched back on, and
+# seconds to wait after switching inverters before the grid meter is followed again
+EXPORT_HYSTERESIS = 200
+EXPORT_DWELL = 60
+
+# an ECU failing CACHE polls in a row is left alone for this many seconds, doubling
+# every time it fails again up to the maximum, and probed with a connect first
+BREAKER_BASE_DELAY = 60
+BREAKER_MAX_DELAY = 3600
+PROBE_TIMEOUT = 3
+
+# the inverter and signal queries are due this many seconds before their interval is
+# over, so the stagger of the polls doesn't push them back a whole ECU query
+QUERY_CADENCE_SLACK = 30
+
+# last good ECU snapshot kept on disk so entities can be set up right away after a restart
+STORAGE_VERSION = 1
+SNAPSHOT_SAVE_DELAY = 60
+
+# number of polls kept for the timing histograms in the diagnostics
+POLL_HISTORY = 100
+# upper bounds in seconds of the timing histogram buckets
+TIMING_BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 20, 30)
+
+# readings kept per inverter in the history ring buffer, a day at the ECU's 5 minute refresh
+HISTORY_SIZE = 288
@@ -0,0 +1,78 @@
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+def inverter_power(inv):
+    return sum(power for power in inv.power if power)
+
+def shed(candidates, excess):
+    # inverters to switch off to bring the power down by excess: the smallest
+    # one that covers what is left on its own, otherwise the largest and go on,
+    # so as little production as possible is lost
+    chosen = []
+    ranked = sorted((power, uid) for uid, power in candidates.items() if power > 0)
+    while ranked and excess > 0:
+        covering = [(power, uid) for power, uid in ranked if power >= excess]
+        power, uid = covering[0] if covering else ranked[-1]
+        ranked.remove((power, uid))
+        chosen.append(uid)
+        excess -= power
+    return chosen
+
+def restore(curtailed, headroom):
+    # curtailed inverters that fit in the headroom with the power they made
+    # before they were switched off, the largest first
+    chosen = []
+    for power, uid in sorted(((power, uid) for uid, power in curtailed.items()), reverse=True):
+        if power <= headroom:
+            chosen.append(uid)
+            headroom -= power
+    return chosen
+
+# keeps the power exported to the grid under a limit by switching inverters off
+# and back on. Inverters are switched off as soon as the export goes over the
+# limit, and only switched on again when the power they made before fits under
+# the limit minus the hysteresis. After every switch the controller waits the
+# dwell time, so the inverters and the grid meter can settle first
+class ExportLimiter():
+    def __init__(self, limit, hysteresis, dwell):
+        self.limit = limit
+        self.hysteresis = hysteresis
+        self.dwell = dwell
+        # inverters we switched off and the power they made before
+        self.curtailed = {}
+        self.last_change = None
+
+    def decide(self, export, inverters, states, now):
+        # the switches to make for a grid meter reading in W as a dict of uid to
+        # True (on) or False (off). inverters are the readings of the last ECU
+        # snapshot, states tells whether an inverter is on as far as we know
+        self.curtailed = {uid: power for uid, power in self.curtailed.items() if not states(uid)}
+        if self.last_change is not None and now - self.last_change < self.dwell:
+            return {}
+        if export > self.limit:
+            candidates = {uid: inverter_power(inv) for uid, inv in inverters.items()
+                          if inv.online and states(uid) and uid not in self.curtailed}
+            return {uid: False for uid in shed(candidates, export - self.limit)}
+        return {uid: True for uid in restore(self.curtailed, self.limit - self.hysteresis - export)}
+
+    def switched(self, switches, inverters, now):
+        # the ECU accepted the switches
+        self.last_change = now
+        for uid, on in switches.items():
+            if on:
+                self.curtailed.pop(uid, None)
+            else:
+                self.curtailed[uid] = inverter_power(inverters[uid])
+
+    def failed(self, now):
+        # don't retry on every meter reading while the ECU doesn't respond
+        self.last_change = now
+
+    def dump_data(self):
+        return {
+            "limit": self.limit,
+            "hysteresis": self.hysteresis,
+            "dwell": self.dwell,
+            "curtailed": dict(self.curtailed),
+        }
@@ -5,16 +5,38 @@ from homeassistant.components.diagnostics import async_redact_data
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import CONF_TOKEN
 from homeassistant.core import HomeAssistant
-
-TO_REDACT = {CONF_TOKEN}
+from homeassistant.helpers.device_registry import DeviceEntry
 
 from .const import (
-    DOMAIN
+    DOMAIN,
+    CONF_SSID,
+    CONF_WPA_PSK,
+    TIMING_BUCKETS,
 )
 
+TO_REDACT = {CONF_TOKEN, CONF_SSID, CONF_WPA_PSK}
+
+# phases of a poll that get a histogram
+TIMING_PHASES = ["duration", "connect", "ecu_query", "inverter_query", "signal_query", "parse"]
 
 _LOGGER = logging.getLogger(__name__)
 
+def timing_histogram(polls, phase):
+    # count the polls per bucket, keyed by the bucket's upper bound in seconds
+    histogram = {f"<={bound}": 0 for bound in TIMING_BUCKETS}
+    histogram[f">{TIMING_BUCKETS[-1]}"] = 0
+    for poll in polls:
+        seconds = poll.get(phase)
+        if seconds is None:
+            continue
+        for bound in TIMING_BUCKETS:
+            if seconds <= bound:
+                histogram[f"<={bound}"] += 1
+                break
+        else:
+            histogram[f">{TIMING_BUCKETS[-1]}"] += 1
+    return histogram
+
 async def async_get_device_diagnostics(
     hass: HomeAssistant, config_entry: ConfigEntry, device: DeviceEntry
 ) -> dict:
@@ -22,9 +44,17 @@ async def async_get_device_diagnostics(
 
     _LOGGER.debug("Diagnostics being called")
 
-    ecu = hass.data[DOMAIN].get("ecu")
-    _LOGGER.debug(f"Diagnostics being called {ecu}")
+    ecu = hass.data[DOMAIN][config_entry.entry_id].get("ecu")
+    _LOGGER.debug("Diagnostics being called %s", ecu)
+
+    polling = ecu.dump_data()
+    polling["histograms"] = {phase: timing_histogram(polling["poll_history"], phase) for phase in TIMING_PHASES}
 
-    diag_data = {"entry": async_redact_data(ecu.ecu.dump_data(), TO_REDACT)}
+    diag_data = {
+        "entry": async_redact_data(config_entry.as_dict(), TO_REDACT),
+        "ecu": ecu.ecu.dump_data(),
+        "polling": polling,
+        "history": ecu.history.as_dict(),
+    }
 
     return diag_data
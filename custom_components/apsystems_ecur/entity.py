@@ -0,0 +1,18 @@
+from homeassistant.core import callback
+from homeassistant.helpers.update_coordinator import (
+    CoordinatorEntity,
+)
+
+# coordinator entity that only writes its state when the poll changed the value
+# it shows, see ECUR.snapshot_changes, or when it became (un)available.
+# Subclasses set _change_key to the key of their value in ECUR.changed
+class APSystemsCoordinatorEntity(CoordinatorEntity):
+    _change_key = None
+    _written_available = None
+
+    @callback
+    def _handle_coordinator_update(self):
+        if self.available == self._written_available and not self._ecu.has_changed(self._change_key):
+            return
+        self._written_available = self.available
+        self.async_write_ha_state()
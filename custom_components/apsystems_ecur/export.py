@@ -0,0 +1,106 @@
+import csv
+import logging
+import os
+from datetime import datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    # pyarrow is optional, without it readings can only be exported as CSV
+    pa = None
+
+from .APSystemsSocket import INVERTER_LAYOUTS
+
+_LOGGER = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {"parquet": "parquet", "arrow": "arrows", "csv": "csv"}
+
+# every row has room for the inverter model with the most channels
+POWER_CHANNELS = max(len(layout.power) for layout in INVERTER_LAYOUTS.values())
+VOLTAGE_CHANNELS = max(len(layout.voltage) for layout in INVERTER_LAYOUTS.values())
+
+COLUMNS = (["ecu_id", "timestamp", "uid", "model", "online", "signal", "temperature", "frequency"]
+    + [f"power_{i + 1}" for i in range(POWER_CHANNELS)]
+    + [f"voltage_{i + 1}" for i in range(VOLTAGE_CHANNELS)])
+
+def export_schema():
+    return pa.schema(
+        [("ecu_id", pa.string()), ("timestamp", pa.timestamp("s")), ("uid", pa.string()), ("model", pa.string()),
+         ("online", pa.bool_()), ("signal", pa.int16()), ("temperature", pa.int16()), ("frequency", pa.float64())]
+        + [(f"power_{i + 1}", pa.int32()) for i in range(POWER_CHANNELS)]
+        + [(f"voltage_{i + 1}", pa.int32()) for i in range(VOLTAGE_CHANNELS)])
+
+def channel(values, index):
+    return values[index] if index < len(values) else None
+
+def snapshot_columns(snapshot):
+    # one row per inverter, built column by column so pyarrow can take the lists as is
+    inverters = list(snapshot.inverters.values())
+    timestamp = datetime.strptime(snapshot.timestamp, "%Y-%m-%d %H:%M:%S")
+    columns = {
+        "ecu_id": [snapshot.ecu_id] * len(inverters),
+        "timestamp": [timestamp] * len(inverters),
+        "uid": [inv.uid for inv in inverters],
+        "model": [inv.model for inv in inverters],
+        "online": [inv.online for inv in inverters],
+        "signal": [inv.signal for inv in inverters],
+        "temperature": [inv.temperature for inv in inverters],
+        "frequency": [inv.frequency for inv in inverters],
+    }
+    for i in range(POWER_CHANNELS):
+        columns[f"power_{i + 1}"] = [channel(inv.power, i) for inv in inverters]
+    for i in range(VOLTAGE_CHANNELS):
+        columns[f"voltage_{i + 1}"] = [channel(inv.voltage, i) for inv in inverters]
+    return columns
+
+# appends the readings of every new snapshot to a file, one poll at a time, so
+# nothing but the current snapshot is kept in memory. All methods block, run
+# them in the executor
+class ReadingExporter():
+    def __init__(self, path, file_format):
+        self.path = path
+        self.format = file_format
+        self.file = None
+        self.writer = None
+        self.schema = None
+        self.rows = 0
+
+    def open(self):
+        if self.format == "csv":
+            self.file = open(self.path, "a", newline="")
+            self.writer = csv.writer(self.file)
+            if self.file.tell() == 0:
+                self.writer.writerow(COLUMNS)
+            return
+        if os.path.exists(self.path):
+            # a columnar file can't be appended to once it is closed
+            raise FileExistsError(f"{self.path} already exists")
+        self.schema = export_schema()
+        if self.format == "parquet":
+            # every poll becomes a row group, the footer is written on close
+            self.writer = pq.ParquetWriter(self.path, self.schema)
+        else:
+            # the IPC stream format stays readable up to the last poll if we never get to close it
+            self.file = pa.OSFile(self.path, "wb")
+            self.writer = pa.ipc.new_stream(self.file, self.schema)
+
+    def write(self, snapshot):
+        if self.writer is None:
+            self.open()
+        columns = snapshot_columns(snapshot)
+        if self.format == "csv":
+            self.writer.writerows(zip(*(columns[column] for column in COLUMNS)))
+            self.file.flush()
+        else:
+            self.writer.write_table(pa.Table.from_pydict(columns, schema=self.schema))
+        self.rows += len(columns["uid"])
+
+    def close(self):
+        if self.writer is not None and self.format != "csv":
+            self.writer.close()
+        if self.file is not None:
+            self.file.close()
+        self.writer = None
+        self.file = None
+        _LOGGER.info("Exported %d inverter readings to %s", self.rows, self.path)
@@ -0,0 +1,49 @@
+import asyncio
+import logging
+import random
+
+from .const import (
+    FLEET_MAX_CONCURRENT,
+    FLEET_JITTER,
+    FLEET_MAX_SPACING,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+# spreads the polls of all configured ECUs over the scan interval and bounds
+# how many are running at once, so the LAN sees a flat and predictable load
+class FleetPoller():
+    def __init__(self, max_concurrent=FLEET_MAX_CONCURRENT, jitter=FLEET_JITTER, max_spacing=FLEET_MAX_SPACING):
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.jitter = jitter
+        self.max_spacing = max_spacing
+        self.intervals = {}
+        self.spacing = 0
+        # loop time before which no other staggered poll may start
+        self.next_start = 0
+
+    def register(self, entry_id, interval):
+        self.intervals[entry_id] = interval.total_seconds()
+        self.update_spacing()
+
+    def unregister(self, entry_id):
+        self.intervals.pop(entry_id, None)
+        self.update_spacing()
+
+    def update_spacing(self):
+        if not self.intervals:
+            self.spacing = 0
+            return
+        self.spacing = min(min(self.intervals.values()) / len(self.intervals), self.max_spacing)
+
+    async def poll(self, update_method, stagger=True):
+        if stagger:
+            # reserve the next free start slot, later polls queue up behind it
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            start = max(now, self.next_start) + random.uniform(0, self.jitter)
+            self.next_start = start + self.spacing
+            _LOGGER.debug("Staggering ECU poll by %.1f seconds", start - now)
+            await asyncio.sleep(start - now)
+        async with self.semaphore:
+            return await update_method()
@@ -0,0 +1,101 @@
+import math
+from array import array
+from datetime import datetime, timezone
+
+NAN = math.nan
+
+# keeps the last readings of one inverter in preallocated arrays, so the memory
+# used doesn't grow with time, NaN marks a reading the ECU didn't report
+class InverterHistory():
+    def __init__(self, size, power_qty, voltage_qty):
+        self.size = size
+        self.next = 0
+        self.count = 0
+        # ECU timestamps as seconds, the readings are whole numbers so single precision is exact
+        self.time = array("d", [NAN]) * size
+        self.temperature = array("f", [NAN]) * size
+        self.signal = array("f", [NAN]) * size
+        self.power = [array("f", [NAN]) * size for i in range(power_qty)]
+        self.voltage = [array("f", [NAN]) * size for i in range(voltage_qty)]
+
+    def fits(self, inv):
+        return len(self.power) == len(inv.power) and len(self.voltage) == len(inv.voltage)
+
+    def append(self, seconds, inv):
+        index = self.next
+        self.time[index] = seconds
+        self.temperature[index] = NAN if inv.temperature is None else inv.temperature
+        self.signal[index] = NAN if inv.signal is None else inv.signal
+        for column, value in zip(self.power, inv.power):
+            column[index] = NAN if value is None else value
+        for column, value in zip(self.voltage, inv.voltage):
+            column[index] = NAN if value is None else value
+        self.next = (index + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def ordered(self, column):
+        # oldest reading first, missing readings as None
+        if not self.count:
+            return []
+        start = (self.next - self.count) % self.size
+        values = column[start:] + column[:self.next] if start >= self.next else column[start:self.next]
+        return [None if math.isnan(value) else value for value in values]
+
+    def series(self):
+        return {
+            "time": [datetime.fromtimestamp(seconds, timezone.utc).strftime("%Y-%m-%d %H:%M:%S") for seconds in self.ordered(self.time)],
+            "temperature": self.ordered(self.temperature),
+            "signal": self.ordered(self.signal),
+            "power": [self.ordered(column) for column in self.power],
+            "voltage": [self.ordered(column) for column in self.voltage],
+        }
+
+    def column_stats(self, column):
+        values = [value for value in self.ordered(column) if value is not None]
+        if not values:
+            return None
+        return {"min": min(values), "max": max(values), "mean": round(sum(values) / len(values), 2), "last": values[-1]}
+
+    def stats(self):
+        return {
+            "readings": self.count,
+            "temperature": self.column_stats(self.temperature),
+            "signal": self.column_stats(self.signal),
+            "power": [self.column_stats(column) for column in self.power],
+            "voltage": [self.column_stats(column) for column in self.voltage],
+        }
+
+# history of every inverter of one ECU, fed with each new snapshot
+class ReadingHistory():
+    def __init__(self, size):
+        self.size = size
+        self.inverters = {}
+        self.last_timestamp = None
+
+    def record(self, snapshot):
+        # the ECU only has new readings when its timestamp moved on
+        if snapshot.timestamp is None or snapshot.timestamp == self.last_timestamp:
+            return False
+        try:
+            # the ECU timestamp has no timezone, it is stored and shown as is
+            seconds = datetime.strptime(snapshot.timestamp, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+        except ValueError:
+            return False
+        self.last_timestamp = snapshot.timestamp
+        for uid, inv in snapshot.inverters.items():
+            history = self.inverters.get(uid)
+            if history is None or not history.fits(inv):
+                # new inverter or it changed model, start over
+                history = self.inverters[uid] = InverterHistory(self.size, len(inv.power), len(inv.voltage))
+            history.append(seconds, inv)
+        return True
+
+    def as_dict(self, uids=None, series=True):
+        result = {}
+        for uid, history in self.inverters.items():
+            if uids and uid not in uids:
+                continue
+            result[uid] = {"stats": history.stats()}
+            if series:
+                result[uid]["series"] = history.series()
+        return result
@@ -15,11 +15,15 @@ from homeassistant.components.sensor import (
     SensorStateClass,
 )
 
+from .entity import APSystemsCoordinatorEntity
 from .const import (
     DOMAIN,
     SOLAR_ICON,
     FREQ_ICON,
-    SIGNAL_ICON
+    SIGNAL_ICON,
+    CACHE_ICON,
+    TIMER_ICON,
+    ALERT_ICON
 )
 
 from homeassistant.const import (
@@ -28,6 +32,7 @@ from homeassistant.const import (
     UnitOfTemperature,
     UnitOfElectricPotential,
     UnitOfFrequency,
+    UnitOfTime,
     PERCENTAGE
 )
 
@@ -36,8 +41,8 @@ _LOGGER = logging.getLogger(__name__)
 
 async def async_setup_entry(hass, config, add_entities, discovery_info=None):
 
-    ecu = hass.data[DOMAIN].get("ecu")
-    coordinator = hass.data[DOMAIN].get("coordinator")
+    ecu = hass.data[DOMAIN][config.entry_id].get("ecu")
+    coordinator = hass.data[DOMAIN][config.entry_id].get("coordinator")
 
     sensors = [
         APSystemsECUSensor(coordinator, ecu, "current_power", 
@@ -71,13 +76,33 @@ async def async_setup_entry(hass, config, add_entities, discovery_info=None):
             icon=SOLAR_ICON,
             entity_category=EntityCategory.DIAGNOSTIC
         ),
+        APSystemsECUSensor(coordinator, ecu, "poll_duration",
+            label="Poll Duration",
+            unit=UnitOfTime.SECONDS,
+            devclass=SensorDeviceClass.DURATION,
+            icon=TIMER_ICON,
+            stateclass=SensorStateClass.MEASUREMENT,
+            entity_category=EntityCategory.DIAGNOSTIC
+        ),
+        APSystemsECUSensor(coordinator, ecu, "consecutive_failures",
+            label="Consecutive Failures",
+            icon=ALERT_ICON,
+            stateclass=SensorStateClass.MEASUREMENT,
+            entity_category=EntityCategory.DIAGNOSTIC
+        ),
+        APSystemsECUSensor(coordinator, ecu, "cache_hits",
+            label="Cache Hits",
+            icon=CACHE_ICON,
+            stateclass=SensorStateClass.TOTAL_INCREASING,
+            entity_category=EntityCategory.DIAGNOSTIC
+        ),
     ]
 
-    inverters = coordinator.data.get("inverters", {})
+    inverters = coordinator.data.inverters
     for uid,inv_data in inverters.items():
-        _LOGGER.debug(f"Inverter {uid} {inv_data.get('channel_qty')}")
+        _LOGGER.debug("Inverter %s %s", uid, inv_data.channel_qty)
         # https://github.com/ksheumaker/homeassistant-apsystems_ecur/issues/110
-        if inv_data.get("channel_qty") != None:
+        if inv_data.channel_qty != None:
             sensors.extend([
                     APSystemsECUInverterSensor(coordinator, ecu, uid, "temperature",
                         label="Temperature",
@@ -109,7 +134,7 @@ async def async_setup_entry(hass, config, add_entities, discovery_info=None):
                         entity_category=EntityCategory.DIAGNOSTIC
                     )
             ])
-            for i in range(0, inv_data.get("channel_qty", 0)):
+            for i in range(0, inv_data.channel_qty):
                 sensors.append(
                     APSystemsECUInverterSensor(coordinator, ecu, uid, f"power", 
                         index=i, label=f"Power Ch {i+1}",
@@ -122,7 +147,7 @@ async def async_setup_entry(hass, config, add_entities, discovery_info=None):
     add_entities(sensors)
 
 
-class APSystemsECUInverterSensor(CoordinatorEntity, SensorEntity):
+class APSystemsECUInverterSensor(APSystemsCoordinatorEntity, SensorEntity):
     def __init__(self, coordinator, ecu, uid, field, index=0, label=None, icon=None, unit=None, devclass=None, stateclass=None, entity_category=None):
 
         super().__init__(coordinator)
@@ -144,6 +169,10 @@ class APSystemsECUInverterSensor(CoordinatorEntity, SensorEntity):
 
         self._name = f"Inverter {self._uid} {self._label}"
         self._state = None
+        if field in ("power", "voltage"):
+            self._change_key = (uid, field, index)
+        else:
+            self._change_key = (uid, field)
 
     @property
     def unique_id(self):
@@ -162,14 +191,13 @@ class APSystemsECUInverterSensor(CoordinatorEntity, SensorEntity):
 
     @property
     def state(self):
-        _LOGGER.debug(f"State called for {self._field}")
-        if self._field == "voltage":
-            return self.coordinator.data.get("inverters", {}).get(self._uid, {}).get("voltage", [])[0]
-        elif self._field == "power":
-            _LOGGER.debug(f"POWER  {self._uid} {self._index}")
-            return self.coordinator.data.get("inverters", {}).get(self._uid, {}).get("power", [])[self._index]
-        else:
-            return self.coordinator.data.get("inverters", {}).get(self._uid, {}).get(self._field)
+        inv = self.coordinator.data.inverters.get(self._uid)
+        if inv is None:
+            return None
+        if self._field in ("power", "voltage"):
+            # the voltage sensor always shows the first channel
+            return getattr(inv, self._field)[self._index]
+        return getattr(inv, self._field)
 
     @property
     def icon(self):
@@ -191,7 +219,6 @@ class APSystemsECUInverterSensor(CoordinatorEntity, SensorEntity):
 
     @property
     def state_class(self):
-        _LOGGER.debug(f"State class {self._stateclass} - {self._field}")
         return self._stateclass
 
     @property
@@ -207,7 +234,7 @@ class APSystemsECUInverterSensor(CoordinatorEntity, SensorEntity):
     def entity_category(self):
         return self._entity_category
 
-class APSystemsECUSensor(CoordinatorEntity, SensorEntity):
+class APSystemsECUSensor(APSystemsCoordinatorEntity, SensorEntity):
 
     def __init__(self, coordinator, ecu, field, label=None, icon=None, unit=None, devclass=None, stateclass=None, entity_category=None):
 
@@ -228,6 +255,7 @@ class APSystemsECUSensor(CoordinatorEntity, SensorEntity):
 
         self._name = f"ECU {self._label}"
         self._state = None
+        self._change_key = field
 
     @property
     def unique_id(self):
@@ -243,8 +271,7 @@ class APSystemsECUSensor(CoordinatorEntity, SensorEntity):
 
     @property
     def state(self):
-        _LOGGER.debug(f"State called for {self._field}")
-        return self.coordinator.data.get(self._field)
+        return getattr(self.coordinator.data, self._field)
 
     @property
     def icon(self):
@@ -267,7 +294,6 @@ class APSystemsECUSensor(CoordinatorEntity, SensorEntity):
 
     @property
     def state_class(self):
-        _LOGGER.debug(f"State class {self._stateclass} - {self._field}")
         return self._stateclass
 
     @property
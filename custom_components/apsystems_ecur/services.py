@@ -0,0 +1,87 @@
+import logging
+from datetime import datetime
+
+import voluptuous as vol
+import homeassistant.helpers.config_validation as cv
+from homeassistant.core import SupportsResponse
+from homeassistant.exceptions import HomeAssistantError
+
+from .const import DOMAIN
+from .export import EXPORT_FORMATS, ReadingExporter, pa
+
+_LOGGER = logging.getLogger(__name__)
+
+SERVICE_GET_HISTORY = "get_history"
+SERVICE_EXPORT_READINGS = "export_readings"
+SERVICE_STOP_EXPORT = "stop_export"
+SERVICES = [SERVICE_GET_HISTORY, SERVICE_EXPORT_READINGS, SERVICE_STOP_EXPORT]
+
+GET_HISTORY_SCHEMA = vol.Schema({
+    vol.Optional("ecu_id"): cv.string,
+    vol.Optional("inverter_uid"): vol.All(cv.ensure_list, [cv.string]),
+    vol.Optional("stats_only", default=False): cv.boolean,
+})
+
+EXPORT_READINGS_SCHEMA = vol.Schema({
+    vol.Optional("ecu_id"): cv.string,
+    vol.Optional("path"): cv.string,
+    vol.Optional("format", default="parquet"): vol.In(list(EXPORT_FORMATS)),
+})
+
+STOP_EXPORT_SCHEMA = vol.Schema({
+    vol.Optional("ecu_id"): cv.string,
+})
+
+def ecus_for_call(hass, call):
+    # every configured ECU, or only the one the call asks for
+    ecus = [entry["ecu"] for entry in hass.data.get(DOMAIN, {}).values()]
+    ecu_id = call.data.get("ecu_id")
+    return [ecu for ecu in ecus if ecu_id is None or ecu.ecu.ecu_id == ecu_id]
+
+def async_setup_services(hass):
+    # services are shared by all ECUs, only register them for the first entry
+    if hass.services.has_service(DOMAIN, SERVICE_GET_HISTORY):
+        return
+
+    async def get_history(call):
+        uids = call.data.get("inverter_uid")
+        series = not call.data["stats_only"]
+        return {ecu.ecu.ecu_id: ecu.history.as_dict(uids, series) for ecu in ecus_for_call(hass, call)}
+
+    async def export_readings(call):
+        ecus = ecus_for_call(hass, call)
+        file_format = call.data["format"]
+        if file_format != "csv" and pa is None:
+            _LOGGER.warning(f"pyarrow is not installed, exporting the readings as CSV instead of {file_format}")
+            file_format = "csv"
+        if "path" in call.data and len(ecus) > 1:
+            raise HomeAssistantError("Every ECU needs its own export file, give an ecu_id with the path")
+        started = datetime.now().strftime("%Y%m%d_%H%M%S")
+        for ecu in ecus:
+            if "path" in call.data:
+                path = hass.config.path(call.data["path"])
+                # resolves the path on the filesystem, so not on the event loop
+                if not await hass.async_add_executor_job(hass.config.is_allowed_path, path):
+                    raise HomeAssistantError(f"Can't export to {path}, add its directory to allowlist_external_dirs")
+            else:
+                path = hass.config.path(f"{DOMAIN}_{ecu.ecu.ecu_id}_{started}.{EXPORT_FORMATS[file_format]}")
+            try:
+                await ecu.start_export(ReadingExporter(path, file_format))
+            except OSError as err:
+                raise HomeAssistantError(f"Can't export the readings of ECU {ecu.ecu.ecu_id}: {err}")
+
+    async def stop_export(call):
+        for ecu in ecus_for_call(hass, call):
+            await ecu.stop_export()
+
+    hass.services.async_register(DOMAIN, SERVICE_GET_HISTORY, get_history,
+        schema=GET_HISTORY_SCHEMA, supports_response=SupportsResponse.ONLY)
+    hass.services.async_register(DOMAIN, SERVICE_EXPORT_READINGS, export_readings,
+        schema=EXPORT_READINGS_SCHEMA)
+    hass.services.async_register(DOMAIN, SERVICE_STOP_EXPORT, stop_export,
+        schema=STOP_EXPORT_SCHEMA)
+
+def async_unload_services(hass):
+    # the last ECU is gone
+    for service in SERVICES:
+        hass.services.async_remove(DOMAIN, service)
@@ -2,6 +2,8 @@ import logging
 
 from homeassistant.util import dt as dt_util
 from homeassistant.components.switch import SwitchEntity
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.helpers.entity import EntityCategory
 from homeassistant.helpers.update_coordinator import (
     CoordinatorEntity
@@ -10,21 +12,26 @@ from homeassistant.helpers.update_coordinator import (
 from .const import (
     DOMAIN,
     RELOAD_ICON,
-    POWER_ICON
+    POWER_ICON,
+    SIGNAL_INVERTERS_SWITCHED,
 )
 
 _LOGGER = logging.getLogger(__name__)
 
 async def async_setup_entry(hass, config, add_entities, discovery_info=None):
 
-    ecu = hass.data[DOMAIN].get("ecu")
-    coordinator = hass.data[DOMAIN].get("coordinator")
+    ecu = hass.data[DOMAIN][config.entry_id].get("ecu")
+    coordinator = hass.data[DOMAIN][config.entry_id].get("coordinator")
     switches = [
         APSystemsECUQuerySwitch(coordinator, ecu, "query_device", 
             label="Query Device", icon=RELOAD_ICON),
         APSystemsECUInvertersSwitch(coordinator, ecu, "inverters_online", 
             label="Inverters Online", icon=POWER_ICON),
     ]
+    if ecu.has_web_control():
+        for uid, inv_data in coordinator.data.inverters.items():
+            if inv_data.channel_qty != None:
+                switches.append(APSystemsInverterSwitch(coordinator, ecu, uid, icon=POWER_ICON))
     add_entities(switches)
 
 class APSystemsECUQuerySwitch(CoordinatorEntity, SwitchEntity):
@@ -69,15 +76,15 @@ class APSystemsECUQuerySwitch(CoordinatorEntity, SwitchEntity):
     def is_on(self):
         return self._ecu.querying
 
-    def turn_off(self, **kwargs):
+    async def async_turn_off(self, **kwargs):
         self._ecu.stop_query()
         self._state = False
-        self.schedule_update_ha_state()
+        self.async_write_ha_state()
     
-    def turn_on(self, **kwargs):
+    async def async_turn_on(self, **kwargs):
         self._ecu.start_query()
         self._state = True
-        self.schedule_update_ha_state()
+        self.async_write_ha_state()
 
 class APSystemsECUInvertersSwitch(CoordinatorEntity, SwitchEntity):
     def __init__(self, coordinator, ecu, field, label=None, icon=None):
@@ -121,12 +128,75 @@ class APSystemsECUInvertersSwitch(CoordinatorEntity, SwitchEntity):
     def is_on(self):
         return self._ecu.inverters_online
 
-    def turn_off(self, **kwargs):
-        self._ecu.inverters_off()
+    async def async_turn_off(self, **kwargs):
+        await self._ecu.inverters_off()
         self._state = False
-        self.schedule_update_ha_state()
+        self.async_write_ha_state()
     
-    def turn_on(self, **kwargs):
-        self._ecu.inverters_on()
+    async def async_turn_on(self, **kwargs):
+        await self._ecu.inverters_on()
         self._state = True
-        self.schedule_update_ha_state()
+        self.async_write_ha_state()
+
+class APSystemsInverterSwitch(CoordinatorEntity, SwitchEntity):
+    def __init__(self, coordinator, ecu, uid, icon=None):
+        super().__init__(coordinator)
+        self.coordinator = coordinator
+        self._ecu = ecu
+        self._uid = uid
+        self._icon = icon
+        self._name = f"Inverter {self._uid} Online"
+
+    @property
+    def unique_id(self):
+        return f"{self._ecu.ecu.ecu_id}_{self._uid}_inverter_online"
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def icon(self):
+        return self._icon
+
+    @property
+    def device_info(self):
+        parent = f"inverter_{self._uid}"
+        return {
+            "identifiers": {
+                (DOMAIN, parent),
+            }
+        }
+
+    @property
+    def entity_category(self):
+        return EntityCategory.CONFIG
+
+    @property
+    def is_on(self):
+        return self._ecu.inverter_on(self._uid)
+
+    async def async_added_to_hass(self):
+        await super().async_added_to_hass()
+        self.async_on_remove(async_dispatcher_connect(self.hass,
+            SIGNAL_INVERTERS_SWITCHED.format(self._ecu.ecu.ecu_id), self._handle_inverters_switched))
+
+    @callback
+    def _handle_inverters_switched(self, uids):
+        # the export limit switched inverters, only theirs have a new state
+        if self._uid in uids:
+            self.async_write_ha_state()
+
+    async def set_state(self, on):
+        # the command queue batches this with the other inverters switched right now
+        try:
+            await self._ecu.commands.set_state(self._uid, on)
+        except Exception as err:
+            _LOGGER.warning(f"Attempt to switch inverter {self._uid} {'on' if on else 'off'} failed with error: {err!r}")
+        self.async_write_ha_state()
+
+    async def async_turn_off(self, **kwargs):
+        await self.set_state(False)
+
+    async def async_turn_on(self, **kwargs):
+        await self.set_state(True)
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# the integration's plain modules are tested without Home Assistant, so they are
+# imported straight from the component directory like the tools do
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "custom_components", "apsystems_ecur"))
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from adaptive import AdaptiveInterval, ADAPTIVE_MARGIN
+
+START = datetime(2024, 6, 1, 8, 0, 0, tzinfo=timezone.utc)
+
+def simulate(max_interval, offset, polls, period=300, drift=0.0, jump_at=None, jump=0):
+    # drives the learner against an ECU that writes new data every period seconds
+    # on its own clock, the data shows up offset seconds later on ours. Returns
+    # (stale, age) of every poll, age is how old the data was when it was read
+    adaptive = AdaptiveInterval(max_interval)
+    now = START + timedelta(seconds=17)
+    results = []
+    for poll in range(polls):
+        current_offset = offset + drift * poll + (jump if jump_at is not None and poll >= jump_at else 0)
+        # the last refresh that is visible to us by now, in ECU clock seconds since START
+        ecu_seconds = ((now - START).total_seconds() - current_offset) // period * period
+        written = START + timedelta(seconds=ecu_seconds)
+        timestamp = written.strftime("%Y-%m-%d %H:%M:%S")
+        stale = timestamp == adaptive.last_timestamp
+        age = (now - written).total_seconds() - current_offset
+        results.append((stale, age))
+        now += timedelta(seconds=adaptive.next_interval(timestamp, now) + 1.5)
+    return results
+
+@pytest.mark.parametrize("max_interval", [300, 600, 900])
+@pytest.mark.parametrize("offset", [0, 47, 3600 + 123, -7200 + 251])
+def test_stays_behind_the_ecu_refreshes(max_interval, offset):
+    results = simulate(max_interval, offset, 200)
+    converged = results[20:]
+    assert not any(stale for stale, age in converged)
+    # read within the margin after the data showed up
+    assert max(age for stale, age in converged) <= ADAPTIVE_MARGIN + 10
+
+def test_follows_a_drifting_ecu_clock():
+    results = simulate(300, 47, 300, drift=0.05)
+    assert sum(stale for stale, age in results[20:]) <= 2
+
+def test_recovers_after_the_ecu_clock_jumps():
+    results = simulate(300, 47, 200, jump_at=60, jump=3600)
+    after_jump = results[80:]
+    assert not any(stale for stale, age in after_jump)
+    assert max(age for stale, age in after_jump) <= ADAPTIVE_MARGIN + 10
+
+def test_learns_the_period_from_the_smallest_step():
+    adaptive = AdaptiveInterval(900)
+    now = START
+    for minutes in (0, 10, 15, 20):
+        timestamp = (START + timedelta(minutes=minutes)).strftime("%Y-%m-%d %H:%M:%S")
+        adaptive.next_interval(timestamp, now + timedelta(minutes=minutes, seconds=30))
+    assert adaptive.period == 300
+
+def test_backs_off_while_the_data_is_stale():
+    adaptive = AdaptiveInterval(300)
+    now = START
+    intervals = [adaptive.next_interval("2024-06-01 08:00:00", now + timedelta(seconds=i)) for i in range(6)]
+    assert intervals[1:] == [30, 60, 120, 240, 300]
+
+def test_waits_for_sunrise_at_night():
+    adaptive = AdaptiveInterval(300)
+    sunrise = START + timedelta(hours=2)
+    assert adaptive.next_interval("2024-06-01 07:00:00", START, sun_up=False, next_sunrise=sunrise) == 7200 + ADAPTIVE_MARGIN
+
+def test_polls_that_skip_the_inverters_are_no_lower_bound():
+    adaptive = AdaptiveInterval(300)
+    adaptive.next_interval("2024-06-01 08:00:00", START)
+    sunrise = START + timedelta(hours=1)
+    adaptive.next_interval("2024-06-01 08:00:00", START + timedelta(minutes=10), sun_up=False, next_sunrise=sunrise, inverters_read=False)
+    assert adaptive.last_poll == START
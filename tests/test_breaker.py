@@ -0,0 +1,58 @@
+import pytest
+
+from breaker import BREAKER_CLOSED, BREAKER_HALF_OPEN, BREAKER_OPEN, CircuitBreaker
+
+def test_opens_after_threshold_failures():
+    breaker = CircuitBreaker(3, 60, 3600)
+    assert breaker.failure(0) is None
+    assert breaker.failure(1) is None
+    delay = breaker.failure(2)
+    assert 30 <= delay <= 60
+    assert breaker.state == BREAKER_OPEN
+    assert not breaker.allow(2 + delay - 1)
+
+def test_half_open_after_the_delay():
+    breaker = CircuitBreaker(1, 60, 3600)
+    delay = breaker.failure(0)
+    assert breaker.allow(delay)
+    assert breaker.state == BREAKER_HALF_OPEN
+
+def test_a_failed_probe_opens_again_with_a_longer_delay():
+    breaker = CircuitBreaker(5, 60, 3600)
+    for now in range(5):
+        breaker.failure(now)
+    breaker.allow(1000)
+    # a single failure is enough when half open
+    delay = breaker.failure(1000)
+    assert breaker.state == BREAKER_OPEN
+    assert 60 <= delay <= 120
+
+def test_delay_is_capped():
+    breaker = CircuitBreaker(1, 60, 300)
+    now = 0
+    for trip in range(10):
+        delay = breaker.failure(now)
+        now += delay
+        breaker.allow(now)
+    assert 150 <= delay <= 300
+
+def test_success_closes_and_reports_the_recovery():
+    breaker = CircuitBreaker(1, 60, 3600)
+    assert not breaker.success()
+    breaker.failure(0)
+    breaker.allow(1000)
+    assert breaker.success()
+    assert breaker.state == BREAKER_CLOSED
+    assert breaker.dump_data(0) == {"state": BREAKER_CLOSED, "failures": 0, "trips": 0, "retry_in": None}
+
+def test_failures_below_the_threshold_are_forgotten_on_success():
+    breaker = CircuitBreaker(3, 60, 3600)
+    breaker.failure(0)
+    breaker.failure(1)
+    breaker.success()
+    assert breaker.failure(2) is None
+
+@pytest.mark.parametrize("threshold", [0, -1])
+def test_threshold_is_at_least_one(threshold):
+    breaker = CircuitBreaker(threshold, 60, 3600)
+    assert breaker.failure(0) is not None
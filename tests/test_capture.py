@@ -0,0 +1,81 @@
+import logging
+
+import pytest
+
+from capture import CAPTURE_MAGIC, CAPTURE_RECORD, CaptureHandler, capture_sessions, read_capture
+
+ECU_QUERY = b"APS1100160001END\n"
+INVERTER_QUERY = b"APS1100280002216200001234END\n"
+
+def emit(handler, direction, frame, created=1000.0):
+    record = logging.LogRecord("wire", logging.INFO, __file__, 0, "%s", (frame.hex(),), None)
+    record.created = created
+    record.direction = direction
+    record.frame = frame
+    handler.emit(record)
+
+def write_capture(path, frames, max_bytes=1024 * 1024):
+    handler = CaptureHandler(str(path), max_bytes)
+    for number, (direction, frame) in enumerate(frames):
+        emit(handler, direction, frame, 1000.0 + number)
+    handler.close()
+
+@pytest.mark.parametrize("use_mmap", [True, False])
+def test_round_trip(tmp_path, use_mmap):
+    frames = [("send", ECU_QUERY), ("recv", b"APS11reply1END\n"), ("send", INVERTER_QUERY), ("error", b"APS11par")]
+    path = tmp_path / "capture.bin"
+    write_capture(path, frames)
+    records = [(when, kind, bytes(frame)) for when, kind, frame in read_capture(str(path), use_mmap)]
+    assert records == [
+        (1000.0, b"s", ECU_QUERY),
+        (1001.0, b"r", b"APS11reply1END\n"),
+        (1002.0, b"s", INVERTER_QUERY),
+        (1003.0, b"e", b"APS11par"),
+    ]
+
+def test_appends_to_an_existing_capture(tmp_path):
+    path = tmp_path / "capture.bin"
+    write_capture(path, [("send", ECU_QUERY)])
+    write_capture(path, [("recv", b"reply")])
+    assert path.read_bytes().count(CAPTURE_MAGIC) == 1
+    assert [kind for when, kind, frame in read_capture(str(path))] == [b"s", b"r"]
+
+def test_ignores_records_without_a_frame(tmp_path):
+    path = tmp_path / "capture.bin"
+    handler = CaptureHandler(str(path), 1024)
+    handler.emit(logging.LogRecord("wire", logging.INFO, __file__, 0, "no frame", (), None))
+    handler.close()
+    assert not path.exists()
+
+def test_stops_at_the_size_limit(tmp_path):
+    path = tmp_path / "capture.bin"
+    limit = len(CAPTURE_MAGIC) + 2 * (CAPTURE_RECORD.size + len(ECU_QUERY))
+    write_capture(path, [("send", ECU_QUERY)] * 5, max_bytes=limit)
+    assert len(list(read_capture(str(path)))) == 2
+    assert path.stat().st_size <= limit
+
+def test_skips_a_record_cut_short(tmp_path):
+    path = tmp_path / "capture.bin"
+    write_capture(path, [("send", ECU_QUERY), ("recv", b"APS11reply1END\n")])
+    path.write_bytes(path.read_bytes()[:-3])
+    assert [kind for when, kind, frame in read_capture(str(path))] == [b"s"]
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "capture.bin"
+    path.write_bytes(b"not a capture file")
+    with pytest.raises(ValueError):
+        list(read_capture(str(path)))
+
+def test_empty_file_has_no_records(tmp_path):
+    path = tmp_path / "capture.bin"
+    path.write_bytes(b"")
+    assert list(read_capture(str(path))) == []
+
+def test_sessions_start_with_the_ecu_query():
+    records = [
+        (1.0, b"s", ECU_QUERY), (2.0, b"r", b"ecu"), (3.0, b"s", INVERTER_QUERY), (4.0, b"r", b"inv"),
+        (5.0, b"s", ECU_QUERY), (6.0, b"e", b"partial"),
+    ]
+    sessions = list(capture_sessions(records))
+    assert [len(session) for session in sessions] == [4, 2]
+    assert sessions[1][0] == (5.0, b"s", ECU_QUERY)
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from commands import InverterCommandQueue
+
+class Recorder():
+    def __init__(self, fail=()):
+        self.batches = []
+        self.fail = set(fail)
+
+    async def send(self, batch):
+        await asyncio.sleep(0)
+        self.batches.append(dict(batch))
+        if self.fail & set(batch):
+            raise OSError("rejected")
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def test_collects_commands_into_batches():
+    recorder = Recorder()
+
+    async def main():
+        queue = InverterCommandQueue(recorder.send, 0.01, 20)
+        return await asyncio.gather(*(queue.set_state(f"u{i}", i % 2 == 0) for i in range(45)))
+
+    assert run(main()) == [None] * 45
+    assert [len(batch) for batch in recorder.batches] == [20, 20, 5]
+    assert recorder.batches[0]["u0"] is True and recorder.batches[0]["u1"] is False
+
+def test_newer_command_replaces_a_pending_one():
+    recorder = Recorder()
+
+    async def main():
+        queue = InverterCommandQueue(recorder.send, 0.01, 20)
+        await asyncio.gather(queue.set_state("a", False), queue.set_state("a", True))
+
+    run(main())
+    assert recorder.batches == [{"a": True}]
+
+def test_errors_reach_every_caller_of_the_batch():
+    recorder = Recorder(fail=["bad"])
+
+    async def main():
+        queue = InverterCommandQueue(recorder.send, 0.01, 2)
+        return await asyncio.gather(queue.set_state("bad", True), queue.set_state("x", True),
+            queue.set_state("y", True), return_exceptions=True)
+
+    first, second, third = run(main())
+    assert isinstance(first, OSError) and isinstance(second, OSError)
+    assert third is None
+
+def test_commands_after_a_flush_start_a_new_batch():
+    recorder = Recorder()
+
+    async def main():
+        queue = InverterCommandQueue(recorder.send, 0.01, 20)
+        await queue.set_state("a", True)
+        await queue.set_state("b", True)
+
+    run(main())
+    assert recorder.batches == [{"a": True}, {"b": True}]
+
+def test_cancel_releases_the_waiters():
+    recorder = Recorder()
+
+    async def main():
+        queue = InverterCommandQueue(recorder.send, 10, 20)
+        waiter = asyncio.ensure_future(queue.set_state("a", True))
+        await asyncio.sleep(0)
+        queue.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert queue.task is None and not queue.pending
+
+    run(main())
+    assert recorder.batches == []
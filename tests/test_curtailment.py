@@ -0,0 +1,75 @@
+import pytest
+
+from APSystemsSocket import InverterReading
+from curtailment import ExportLimiter, restore, shed
+
+def reading(uid, power, online=True):
+    return InverterReading(uid, online, 80, "YC600/DS3 series", 2, 30, 50.0, (power // 2, power - power // 2), (230,))
+
+INVERTERS = {uid: reading(uid, power) for uid, power in [("a", 300), ("b", 500), ("c", 120)]}
+
+@pytest.mark.parametrize("excess, chosen", [
+    (250, ["a"]),            # the smallest one that covers it
+    (100, ["c"]),
+    (700, ["b", "a"]),       # none covers it, the largest first
+    (5000, ["b", "a", "c"]),
+])
+def test_shed_loses_as_little_as_possible(excess, chosen):
+    assert shed({"a": 300, "b": 500, "c": 120, "d": 0}, excess) == chosen
+
+def test_restore_fits_the_largest_first():
+    assert restore({"a": 300, "b": 500, "c": 120}, 450) == ["a", "c"]
+    assert restore({"a": 300}, 299) == []
+
+class Fleet():
+    # on/off state as the ECU would have it after the switches
+    def __init__(self):
+        self.states = {}
+
+    def on(self, uid):
+        return self.states.get(uid, True)
+
+def step(limiter, fleet, export, now):
+    switches = limiter.decide(export, INVERTERS, fleet.on, now)
+    if switches:
+        fleet.states.update(switches)
+        limiter.switched(switches, INVERTERS, now)
+    return switches
+
+def test_switches_off_over_the_limit():
+    limiter, fleet = ExportLimiter(1000, 200, 60), Fleet()
+    assert step(limiter, fleet, 1250, 0) == {"a": False}
+    assert limiter.curtailed == {"a": 300}
+
+def test_waits_the_dwell_time_after_a_switch():
+    limiter, fleet = ExportLimiter(1000, 200, 60), Fleet()
+    step(limiter, fleet, 1250, 0)
+    assert step(limiter, fleet, 2000, 59) == {}
+    assert step(limiter, fleet, 1100, 60) == {"c": False}
+
+def test_hysteresis_keeps_inverters_off_near_the_limit():
+    limiter, fleet = ExportLimiter(1000, 200, 60), Fleet()
+    step(limiter, fleet, 1250, 0)
+    # 300 W back on would end up between limit - hysteresis and the limit
+    assert step(limiter, fleet, 600, 100) == {}
+    assert step(limiter, fleet, 500, 200) == {"a": True}
+    assert limiter.curtailed == {}
+
+def test_only_switches_online_inverters_that_are_on():
+    limiter, fleet = ExportLimiter(0, 0, 0), Fleet()
+    inverters = dict(INVERTERS, b=reading("b", 500, online=False))
+    fleet.states["a"] = False
+    assert limiter.decide(1000, inverters, fleet.on, 0) == {"c": False}
+
+def test_forgets_inverters_switched_on_by_someone_else():
+    limiter, fleet = ExportLimiter(1000, 200, 60), Fleet()
+    step(limiter, fleet, 1250, 0)
+    fleet.states["a"] = True
+    assert step(limiter, fleet, 900, 100) == {}
+    assert limiter.curtailed == {}
+
+def test_a_failure_also_waits_the_dwell_time():
+    limiter, fleet = ExportLimiter(1000, 200, 60), Fleet()
+    limiter.failed(0)
+    assert limiter.decide(2000, INVERTERS, fleet.on, 30) == {}
+    assert limiter.decide(2000, INVERTERS, fleet.on, 60) != {}
@@ -0,0 +1,48 @@
+import pytest
+
+from APSystemsSocket import EcuSnapshot, InverterReading
+from history import ReadingHistory
+
+def reading(uid, power, voltage=(230,), temperature=30, signal=80):
+    return InverterReading(uid, True, signal, "YC600/DS3 series", len(power), temperature, 50.0, tuple(power), tuple(voltage))
+
+def snapshot(minute, *inverters):
+    return EcuSnapshot(ecu_id="216200001234", timestamp=f"2024-06-01 10:{minute:02d}:00",
+        inverters={inv.uid: inv for inv in inverters})
+
+def test_keeps_the_last_readings_oldest_first():
+    history = ReadingHistory(3)
+    for minute in range(5):
+        assert history.record(snapshot(minute, reading("a", (minute, 10 * minute))))
+    series = history.as_dict()["a"]["series"]
+    assert series["time"] == ["2024-06-01 10:02:00", "2024-06-01 10:03:00", "2024-06-01 10:04:00"]
+    assert series["power"] == [[2, 3, 4], [20, 30, 40]]
+
+def test_only_records_new_timestamps():
+    history = ReadingHistory(3)
+    assert history.record(snapshot(0, reading("a", (1, 2))))
+    assert not history.record(snapshot(0, reading("a", (5, 6))))
+    assert history.as_dict()["a"]["stats"]["readings"] == 1
+
+def test_missing_readings_are_left_out_of_the_stats():
+    history = ReadingHistory(4)
+    history.record(snapshot(0, reading("a", (100, None), temperature=20)))
+    history.record(snapshot(1, reading("a", (200, None), temperature=None)))
+    result = history.as_dict(series=False)["a"]
+    assert "series" not in result
+    assert result["stats"]["power"][0] == {"min": 100, "max": 200, "mean": 150, "last": 200}
+    assert result["stats"]["power"][1] is None
+    assert result["stats"]["temperature"]["last"] == 20
+
+def test_starts_over_when_the_inverter_changes_model():
+    history = ReadingHistory(4)
+    history.record(snapshot(0, reading("a", (1, 2))))
+    history.record(snapshot(1, reading("a", (1, 2, 3, 4), voltage=(230, 231, 232))))
+    series = history.as_dict()["a"]["series"]
+    assert len(series["time"]) == 1
+    assert len(series["power"]) == 4
+
+def test_filters_on_uid():
+    history = ReadingHistory(2)
+    history.record(snapshot(0, reading("a", (1, 2)), reading("b", (3, 4))))
+    assert list(history.as_dict(uids=["b"])) == ["b"]
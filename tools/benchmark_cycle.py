@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+# End-to-end poll cycle benchmark against the fake ECU from ecu_simulator.py.
+#
+# Runs ECUR.update (or APSystemsSocket.query_ecu when Home Assistant isn't
+# installed) for every combination of ECU response delay and socket_sleep_time
+# and reports the wall clock time per cycle split into connect, send, wait for
+# the first byte, receive and everything else (mostly socket_sleep_time), plus
+# how long executor threads were kept busy.
+#
+#   python3 tools/benchmark_cycle.py --delays 0,0.2,1 --sleep-times 0,1,5
+#   python3 tools/benchmark_cycle.py --persistent --inverters 01:60
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "custom_components", "apsystems_ecur"))
+sys.path.insert(0, ROOT)
+
+from ecu_simulator import FakeECU
+
+try:
+    from custom_components.apsystems_ecur import ECUR
+    from custom_components.apsystems_ecur import APSystemsSocket as aps
+except ImportError:
+    # without Home Assistant we can only drive the socket client itself
+    ECUR = None
+    import APSystemsSocket as aps
+
+PHASES = ["connect", "send", "wait", "recv", "other"]
+
+class TimedReader():
+    def __init__(self, reader, socket):
+        self.reader = reader
+        self.socket = socket
+
+    async def read(self, size):
+        start = time.perf_counter()
+        data = await self.reader.read(size)
+        # the first read after a command is spent waiting for the ECU to answer
+        phase = "recv" if self.socket.first_byte_seen else "wait"
+        self.socket.first_byte_seen = True
+        self.socket.add(phase, time.perf_counter() - start)
+        return data
+
+class TimedSocket(aps.APSystemsSocket):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.first_byte_seen = False
+
+    def add(self, phase, seconds):
+        self.phases[phase] += seconds
+
+    async def open_socket(self):
+        start = time.perf_counter()
+        await super().open_socket()
+        self.add("connect", time.perf_counter() - start)
+        self.reader = TimedReader(self.reader, self)
+
+    async def send_read_from_socket(self, cmd):
+        self.first_byte_seen = False
+        start = time.perf_counter()
+        drain = self.writer.drain
+
+        async def timed_drain():
+            await drain()
+            self.add("send", time.perf_counter() - start)
+        self.writer.drain = timed_drain
+        try:
+            return await super().send_read_from_socket(cmd)
+        finally:
+            self.writer.drain = drain
+
+class BusyExecutor(ThreadPoolExecutor):
+    # keeps track of how long its threads were busy running jobs
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.busy = 0.0
+
+    def submit(self, fn, *args, **kwargs):
+        def timed():
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.busy += time.perf_counter() - start
+        return super().submit(timed)
+
+async def run_case(port, delay, sleep_time, cycles, persistent, fake):
+    fake.latency = delay
+    socket = TimedSocket("127.0.0.1", False, port=port, persistent=persistent)
+    socket.socket_sleep_time = sleep_time
+    if ECUR is not None:
+        ecur = ECUR("127.0.0.1", "ssid", "wpa", 5, False, persistent)
+        ecur.ecu = socket
+        update = ecur.update
+    else:
+        update = socket.query_ecu
+
+    executor = BusyExecutor()
+    asyncio.get_running_loop().set_default_executor(executor)
+    totals = []
+    phases = dict.fromkeys(PHASES, 0.0)
+    for i in range(cycles):
+        socket.phases = dict.fromkeys(PHASES, 0.0)
+        start = time.perf_counter()
+        await update()
+        total = time.perf_counter() - start
+        socket.phases["other"] = total - sum(socket.phases.values())
+        totals.append(total)
+        for phase in PHASES:
+            phases[phase] += socket.phases[phase] / cycles
+    busy = executor.busy / cycles
+    executor.shutdown()
+    return statistics.mean(totals), max(totals), phases, busy
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark a full ECU poll cycle")
+    parser.add_argument("--delays", default="0,0.2,1", help="comma separated ECU response delays in seconds")
+    parser.add_argument("--sleep-times", default="0,1,5", help="comma separated socket_sleep_time values")
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--inverters", default="01:16,02:4")
+    parser.add_argument("--persistent", action="store_true", help="use a persistent connection")
+    parser.add_argument("--close-after-reply", action="store_true", help="ECU closes the socket after every reply")
+    args = parser.parse_args()
+
+    fake = FakeECU(mix=args.inverters, close_after_reply=args.close_after_reply, seed=1)
+    servers = await fake.start("127.0.0.1", 0)
+    port = servers[0].sockets[0].getsockname()[1]
+    print(f"driving {'ECUR.update' if ECUR is not None else 'APSystemsSocket.query_ecu (Home Assistant not installed)'} "
+          f"with {len(fake.inverters)} inverters, {args.cycles} cycles per case")
+    print(f"{'delay':>6} {'sleep':>6} {'mean':>8} {'max':>8} " + " ".join(f"{phase:>8}" for phase in PHASES) + f" {'executor':>9}")
+    for delay in [float(value) for value in args.delays.split(",")]:
+        for sleep_time in [float(value) for value in args.sleep_times.split(",")]:
+            mean, worst, phases, busy = await run_case(port, delay, sleep_time, args.cycles, args.persistent, fake)
+            print(f"{delay:6.2f} {sleep_time:6.2f} {mean:8.3f} {worst:8.3f} "
+                  + " ".join(f"{phases[phase]:8.3f}" for phase in PHASES) + f" {busy:9.3f}")
+    for server in servers:
+        server.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+# Micro-benchmarks for the APSystemsSocket parsers on synthetic frames.
+#
+#   python3 tools/benchmark_parser.py                          # print results
+#   python3 tools/benchmark_parser.py --save baseline.json     # store a baseline
+#   python3 tools/benchmark_parser.py --compare baseline.json  # exit 1 on a regression
+#   python3 tools/benchmark_parser.py --scalar                 # disable the numpy decoder
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "custom_components", "apsystems_ecur"))
+
+import APSystemsSocket as aps
+import ecu_frames
+
+SIZES = [1, 16, 128, 512, 1024]
+MIXES = {
+    "yc600": "01",
+    "yc1000": "02",
+    "qs1": "03",
+    "mixed": "01,02,03",
+}
+
+class BenchSocket(aps.APSystemsSocket):
+    # the 4 digit length field can't describe synthetic frames over 9999 bytes,
+    # ecu_frames wraps it around, so compare it the same way for those
+    def check_ecu_checksum(self, data, cmd):
+        if len(data) - 1 < 10000:
+            return super().check_ecu_checksum(data, cmd)
+        if int(data[5:9]) != (len(data) - 1) % 10000:
+            raise aps.APSystemsInvalidData(f"Checksum on '{cmd}' failed")
+        return True
+
+def decode_inverters(ecu):
+    # forget the previous decode, otherwise identical frames are simply reused
+    ecu.decoded_frames = None
+    return ecu.process_inverter_data()
+
+def make_mix(models, size):
+    # spread size inverters round robin over the models
+    models = models.split(",")
+    counts = [size // len(models) + (i < size % len(models)) for i in range(len(models))]
+    return ",".join(f"{model}:{count}" for model, count in zip(models, counts) if count)
+
+def make_socket(mix, size, offline=0.1, seed=1):
+    inverters = ecu_frames.make_inverters(make_mix(mix, size), offline, seed)
+    ecu = BenchSocket("bench", False,
+                      raw_ecu=ecu_frames.ecu_frame_for(inverters),
+                      raw_inverter=ecu_frames.inverter_frame(inverters))
+    ecu.inverter_raw_signal = ecu_frames.signal_frame(inverters)
+    ecu.process_ecu_data()
+    return ecu
+
+def measure(func, min_time):
+    # run func until at least min_time has passed, returns seconds per call
+    func()
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for i in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / loops
+        loops *= 2
+
+def allocations(func):
+    # peak traced memory and the number of blocks allocated by a single call
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    func()
+    after = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+    return peak, blocks
+
+def run(sizes, mixes, min_time):
+    results = {}
+    for mix_name, models in mixes.items():
+        for size in sizes:
+            ecu = make_socket(models, size)
+            cases = {
+                "process_ecu_data": ecu.process_ecu_data,
+                "process_signal_data": ecu.process_signal_data,
+                "process_inverter_data": lambda: decode_inverters(ecu),
+                "process_inverter_data_unchanged": ecu.process_inverter_data,
+                "check_ecu_checksum": lambda: ecu.check_ecu_checksum(ecu.inverter_raw_data, "Inverter data"),
+            }
+            for name, func in cases.items():
+                seconds = measure(func, min_time)
+                peak, blocks = allocations(func)
+                key = f"{name}[{mix_name}-{size}]"
+                results[key] = {
+                    "ops_per_sec": 1 / seconds,
+                    "ns_per_inverter": seconds * 1e9 / size,
+                    "peak_bytes": peak,
+                    "blocks": blocks,
+                }
+                print(f"{key:45} {1 / seconds:12.0f} ops/s {seconds * 1e9 / size:10.0f} ns/inv "
+                      f"{peak / 1024:9.1f} KiB peak {blocks:7d} blocks")
+    return results
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        expected = baseline[key]["ops_per_sec"]
+        if result["ops_per_sec"] < expected * (1 - tolerance):
+            regressions.append(f"{key}: {result['ops_per_sec']:.0f} ops/s, baseline {expected:.0f} ops/s")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ECU frame parsers")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in SIZES), help="comma separated inverter counts")
+    parser.add_argument("--mixes", default=",".join(MIXES), help=f"comma separated mixes from {', '.join(MIXES)}")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds to run every case")
+    parser.add_argument("--scalar", action="store_true", help="always use the scalar inverter decoder")
+    parser.add_argument("--save", metavar="PATH", help="write the results as a baseline")
+    parser.add_argument("--compare", metavar="PATH", help="fail when slower than this baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    if args.scalar:
+        aps.VECTOR_MIN_INVERTERS = sys.maxsize
+    print(f"numpy decoder: {'enabled' if aps.np is not None and not args.scalar else 'disabled'}")
+    sizes = [int(size) for size in args.sizes.split(",")]
+    mixes = {name: MIXES[name] for name in args.mixes.split(",")}
+    results = run(sizes, mixes, args.min_time)
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
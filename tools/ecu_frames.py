@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+# Builds valid ECU reply frames for the simulator and the benchmarks. The layouts
+# are written down here independently of the parser in APSystemsSocket.py, so
+# a parser change can be checked against them.
+
+import random
+import struct
+from datetime import datetime
+
+CMD_SUFFIX = b"END\n"
+ECU_QUERY = "APS1100160001"
+INVERTER_QUERY_PREFIX = "APS1100280002"
+SIGNAL_QUERY_PREFIX = "APS1100280030"
+
+# words after the 9 byte record header: frequency, temperature and the
+# power (P) / voltage (V) words in the order the ECU sends them
+INVERTER_WORDS = {
+    "01": "PVPV",
+    "02": "PVPVPVP",
+    "03": "PVPPP",
+    "04": "PVPV",
+    "05": "PVPV",
+}
+INVERTER_MODELS = list(INVERTER_WORDS)
+
+def build_frame(cmd, body):
+    # APS + version + length + command + body + END, the length counts every
+    # byte except the final newline. Only 4 digits are available, synthetic
+    # frames larger than 9999 bytes get the length wrapped around
+    length = 3 + 2 + 4 + len(cmd) + len(body) + len(CMD_SUFFIX) - 1
+    return b"APS11" + b"%04d" % (length % 10000) + cmd + body + CMD_SUFFIX
+
+def ecu_frame(ecu_id="216200001234", ecu_type="01", lifetime_energy=12345.6, current_power=850,
+              today_energy=12.34, qty=0, online=0, firmware="ECU_R_1.2.22", timezone="Europe/Amsterdam"):
+    body = ecu_id.encode() + ecu_type.encode()
+    body += struct.pack(">III", round(lifetime_energy * 10), current_power, round(today_energy * 100))
+    firmware = firmware.encode()
+    if ecu_type == "01":
+        timezone = timezone.encode()
+        body += bytes(7) + struct.pack(">HH", qty, online) + bytes(2)
+        body += b"%03d" % len(firmware) + firmware + b"%03d" % len(timezone) + timezone
+    else:
+        body += struct.pack(">HH", qty, online) + bytes(6)
+        body += b"%03d" % len(firmware) + firmware
+    return build_frame(b"0001", body)
+
+def inverter_record(inv):
+    record = bytes.fromhex(inv["uid"]) + bytes([inv["online"]]) + inv["model"].encode()
+    if inv["model"] not in INVERTER_WORDS:
+        return record
+    words = [round(inv["frequency"] * 10), inv["temperature"] + 100]
+    power = iter(inv["power"])
+    voltage = iter(inv["voltage"])
+    for word in INVERTER_WORDS[inv["model"]]:
+        words.append(next(power) if word == "P" else next(voltage))
+    return record + struct.pack(">%dH" % len(words), *words)
+
+def inverter_frame(inverters, timestamp=None):
+    timestamp = timestamp or datetime.now()
+    body = b"0001" + struct.pack(">H", len(inverters)) + bytes.fromhex(timestamp.strftime("%Y%m%d%H%M%S"))
+    body += b"".join(inverter_record(inv) for inv in inverters)
+    return build_frame(b"0002", body)
+
+def signal_frame(inverters):
+    body = b"00" + b"".join(bytes.fromhex(inv["uid"]) + bytes([inv["signal"]]) for inv in inverters)
+    return build_frame(b"0030", body)
+
+def make_inverter(model, rng=random, online=True):
+    channels = INVERTER_WORDS.get(model, "")
+    return {
+        "uid": "%012d" % rng.randrange(10 ** 11, 10 ** 12),
+        "model": model,
+        "online": int(online),
+        "frequency": round(rng.uniform(49.9, 50.1), 1),
+        "temperature": rng.randrange(10, 60),
+        "power": [rng.randrange(0, 400) for word in channels if word == "P"],
+        "voltage": [rng.randrange(220, 245) for word in channels if word == "V"],
+        "signal": rng.randrange(0, 256),
+    }
+
+def parse_mix(mix):
+    # "01:10,02:4" means ten YC600 and four YC1000 inverters
+    counts = []
+    for part in mix.split(","):
+        model, _, qty = part.partition(":")
+        counts.append((model.strip(), int(qty or 1)))
+    return counts
+
+def make_inverters(mix="01:4", offline=0.0, seed=None):
+    rng = random.Random(seed)
+    inverters = []
+    for model, qty in parse_mix(mix):
+        for i in range(qty):
+            inverters.append(make_inverter(model, rng, online=rng.random() >= offline))
+    return inverters
+
+def ecu_frame_for(inverters, ecu_id="216200001234", ecu_type="01", **kwargs):
+    online = [inv for inv in inverters if inv["online"]]
+    current_power = sum(sum(inv["power"]) for inv in online)
+    return ecu_frame(ecu_id, ecu_type, current_power=current_power,
+                     qty=len(inverters), online=len(online), **kwargs)
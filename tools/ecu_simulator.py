@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+
+# Stand-alone fake ECU for offline testing and benchmarking.
+#
+# Answers the ECU, inverter and signal commands on the ECU socket port and
+# stubs the /index.php/... web endpoints used for switching inverters and
+# restarting the ECU. Faults can be injected to exercise the client:
+#
+#   python3 tools/ecu_simulator.py --inverters 01:12,02:4,03:2 --latency 0.3
+#   python3 tools/ecu_simulator.py --fragment 64 --truncate 0.1 --garbage 0.05
+#   python3 tools/ecu_simulator.py --close-after-reply   # ECU-R style reconnects
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from datetime import datetime
+from urllib.parse import parse_qs
+
+import ecu_frames
+
+_LOGGER = logging.getLogger("ecu_simulator")
+
+class FakeECU():
+    def __init__(self, ecu_id="216200001234", ecu_type="01", mix="01:4", offline=0.0,
+                 latency=0.0, fragment=0, fragment_delay=0.0, truncate=0.0, garbage=0.0,
+                 close_after_reply=False, refresh=300, seed=None):
+        self.ecu_id = ecu_id
+        self.ecu_type = ecu_type
+        self.latency = latency
+        self.fragment = fragment
+        self.fragment_delay = fragment_delay
+        self.truncate = truncate
+        self.garbage = garbage
+        self.close_after_reply = close_after_reply
+        # the real ECU only collects new inverter data every few minutes
+        self.refresh = refresh
+        self.rng = random.Random(seed)
+        self.inverters = ecu_frames.make_inverters(mix, offline, seed)
+        self.inverters_on = True
+        # uids of the inverters switched off one by one
+        self.switched_off = set()
+        self.requests = []
+        self.timestamp = None
+        self.refreshed = 0
+        self.update_data()
+
+    def update_data(self):
+        now = time.monotonic()
+        if self.timestamp and now - self.refreshed < self.refresh:
+            return
+        self.refreshed = now
+        self.timestamp = datetime.now().replace(microsecond=0)
+        for inv in self.inverters:
+            producing = self.inverters_on and inv["uid"] not in self.switched_off
+            inv["power"] = [max(0, p + self.rng.randrange(-20, 21)) if producing else 0 for p in inv["power"]]
+            inv["temperature"] = min(80, max(0, inv["temperature"] + self.rng.randrange(-1, 2)))
+
+    def reply(self, cmd):
+        self.update_data()
+        if cmd.startswith(ecu_frames.ECU_QUERY.encode()):
+            return ecu_frames.ecu_frame_for(self.inverters, self.ecu_id, self.ecu_type)
+        if cmd.startswith(ecu_frames.INVERTER_QUERY_PREFIX.encode()):
+            return ecu_frames.inverter_frame(self.inverters, self.timestamp)
+        if cmd.startswith(ecu_frames.SIGNAL_QUERY_PREFIX.encode()):
+            return ecu_frames.signal_frame(self.inverters)
+        _LOGGER.warning("Unknown command %r", cmd)
+        return None
+
+    def mangle(self, frame):
+        if self.rng.random() < self.garbage:
+            _LOGGER.info("Injecting garbage")
+            return bytes(self.rng.randrange(256) for i in range(len(frame)))
+        if self.rng.random() < self.truncate:
+            _LOGGER.info("Truncating reply")
+            return frame[:self.rng.randrange(1, len(frame))]
+        return frame
+
+    async def send(self, writer, frame):
+        if not self.fragment:
+            writer.write(frame)
+            await writer.drain()
+            return
+        for start in range(0, len(frame), self.fragment):
+            writer.write(frame[start:start + self.fragment])
+            await writer.drain()
+            await asyncio.sleep(self.fragment_delay)
+
+    async def handle_socket(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        try:
+            while True:
+                cmd = await reader.readuntil(ecu_frames.CMD_SUFFIX)
+                _LOGGER.debug("%s sent %r", peer, cmd)
+                frame = self.reply(cmd)
+                if frame is None:
+                    break
+                await asyncio.sleep(self.latency)
+                await self.send(writer, self.mangle(frame))
+                if self.close_after_reply:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def handle_http(self, method, path, body):
+        self.requests.append((method, path, body))
+        _LOGGER.info("HTTP %s %s %s", method, path, body)
+        if not path.startswith("/index.php/"):
+            return 404, {"error": "not found"}
+        if path.endswith("/set_switch_all_off"):
+            self.inverters_on = False
+            self.switched_off.clear()
+        elif path.endswith("/set_switch_all_on"):
+            self.inverters_on = True
+            self.switched_off.clear()
+        elif path.endswith("/set_switch_state"):
+            # every id is an inverter uid followed by 1 for on or 2 for off
+            for value in body.get("ids[]", []):
+                if value.endswith("2"):
+                    self.switched_off.add(value[:-1])
+                else:
+                    self.switched_off.discard(value[:-1])
+        return 200, {"value": 0}
+
+    async def handle_http_connection(self, reader, writer):
+        try:
+            request = await reader.readuntil(b"\r\n\r\n")
+            lines = request.decode("latin-1").split("\r\n")
+            method, path, version = lines[0].split(" ", 2)
+            headers = {}
+            for line in lines[1:]:
+                key, _, value = line.partition(":")
+                headers[key.strip().lower()] = value.strip()
+            body = b""
+            if int(headers.get("content-length", 0)):
+                body = await reader.readexactly(int(headers["content-length"]))
+            await asyncio.sleep(self.latency)
+            status, payload = self.handle_http(method, path, parse_qs(body.decode("latin-1")))
+            content = json.dumps(payload).encode()
+            writer.write(b"HTTP/1.1 %d OK\r\nContent-Type: application/json\r\nContent-Length: %d\r\nConnection: close\r\n\r\n" % (status, len(content)) + content)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=8899, http_port=None):
+        servers = [await asyncio.start_server(self.handle_socket, host, port)]
+        if http_port is not None:
+            servers.append(await asyncio.start_server(self.handle_http_connection, host, http_port))
+        return servers
+
+async def main():
+    parser = argparse.ArgumentParser(description="Fake APSystems ECU")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8899)
+    parser.add_argument("--http-port", type=int, default=8080, help="port for the /index.php stub, 80 on a real ECU")
+    parser.add_argument("--ecu-id", default="216200001234")
+    parser.add_argument("--ecu-type", choices=["01", "02"], default="01", help="ECU data layout at byte 25")
+    parser.add_argument("--inverters", default="01:4", help="inverter mix as model:count,... with models 01-05")
+    parser.add_argument("--offline", type=float, default=0.0, help="fraction of inverters reported offline")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before every reply")
+    parser.add_argument("--fragment", type=int, default=0, help="send replies in chunks of this many bytes")
+    parser.add_argument("--fragment-delay", type=float, default=0.01, help="seconds between chunks")
+    parser.add_argument("--truncate", type=float, default=0.0, help="probability a reply is cut short")
+    parser.add_argument("--garbage", type=float, default=0.0, help="probability a reply is random bytes")
+    parser.add_argument("--close-after-reply", action="store_true", help="close the socket after every reply")
+    parser.add_argument("--refresh", type=int, default=300, help="seconds between inverter data refreshes")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format="%(asctime)s %(message)s")
+    ecu = FakeECU(args.ecu_id, args.ecu_type, args.inverters, args.offline, args.latency,
+                  args.fragment, args.fragment_delay, args.truncate, args.garbage,
+                  args.close_after_reply, args.refresh, args.seed)
+    servers = await ecu.start(args.host, args.port, args.http_port)
+    _LOGGER.info("Fake ECU %s with %d inverters on %s:%d, web stub on port %d",
+                 args.ecu_id, len(ecu.inverters), args.host, args.port, args.http_port)
+    await asyncio.gather(*(server.serve_forever() for server in servers))
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+# Replays a raw frame capture through APSystemsSocket at full speed. The capture
+# is written next to the wire trace when that option is on, see capture.py.
+# Every captured poll goes through query_ecu again with the socket answering
+# from the capture instead of the network, so decode errors seen in the field
+# can be reproduced and the parsers benchmarked on real payloads.
+#
+#   python3 tools/replay_capture.py apsystems_ecur_capture_<entry_id>.bin
+#   python3 tools/replay_capture.py capture.bin --dump         # print every decoded snapshot
+#   python3 tools/replay_capture.py capture.bin --repeat 100   # time the decode of every poll
+#   python3 tools/replay_capture.py capture.bin --no-mmap      # read the file instead of mapping it
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "custom_components", "apsystems_ecur"))
+
+import APSystemsSocket as aps
+from capture import capture_sessions, read_capture
+
+# commands are matched on the part before the ECU id
+COMMAND_PREFIX = 13
+
+class ReplaySocket(aps.APSystemsSocket):
+    # answers every command with the next reply captured for it, no network involved
+    def __init__(self, nographs=False):
+        super().__init__("replay", nographs)
+        self.socket_sleep_time = 0
+        self.replies = defaultdict(deque)
+
+    def load(self, session):
+        # the reply, or failed read, following each command sent in a captured poll
+        self.replies.clear()
+        command = None
+        for when, kind, frame in session:
+            if kind == b"s":
+                command = frame[:COMMAND_PREFIX]
+            elif command is not None:
+                self.replies[command].append((kind, frame))
+                command = None
+
+    async def open_socket(self):
+        self.socket_open = True
+
+    async def close_socket(self):
+        self.socket_open = False
+
+    async def send_read_from_socket(self, cmd):
+        replies = self.replies[cmd.encode()[:COMMAND_PREFIX]]
+        if not replies:
+            raise aps.APSystemsInvalidData(f"no captured reply to {cmd.strip()}")
+        kind, frame = replies.popleft()
+        self.read_buffer = frame
+        if kind == b"e":
+            raise aps.APSystemsInvalidData(f"captured read failed after {len(frame)} bytes")
+        return frame
+
+def describe(snapshot):
+    online = sum(1 for inv in snapshot.inverters.values() if inv.online)
+    return f"ECU data of {snapshot.timestamp}, {len(snapshot.inverters)} inverters, {online} online, {snapshot.current_power} W"
+
+async def replay(sessions, args):
+    socket = ReplaySocket(args.no_graphs)
+    socket.persistent = args.persistent
+    results = defaultdict(int)
+    decode_time = 0.0
+    for number, session in enumerate(sessions, 1):
+        when = datetime.fromtimestamp(session[0][0]).isoformat(sep=" ", timespec="seconds")
+        socket.load(session)
+        try:
+            snapshot = await socket.query_ecu()
+        except Exception as err:
+            results["failed"] += 1
+            print(f"poll {number} at {when}: {type(err).__name__}: {err}")
+            continue
+        results["ok"] += 1
+        if socket.inverter_data_unchanged:
+            results["unchanged"] += 1
+        print(f"poll {number} at {when}: {describe(snapshot)}")
+        if args.dump:
+            print(json.dumps(snapshot.as_dict(), indent=2))
+        if args.repeat:
+            start = time.perf_counter()
+            for i in range(args.repeat):
+                # forget the previous decode so every round decodes the frames again
+                socket.decoded_frames = None
+                socket.process_ecu_data()
+                socket.process_inverter_data()
+            decode_time += (time.perf_counter() - start) / args.repeat
+    print(f"{results['ok']} polls decoded ({results['unchanged']} unchanged), {results['failed']} failed")
+    if args.repeat and results["ok"]:
+        print(f"decode takes {decode_time / results['ok'] * 1e6:.0f} us per poll on average")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a raw ECU frame capture through the parser")
+    parser.add_argument("capture", help="capture file written with the wire trace option")
+    parser.add_argument("--dump", action="store_true", help="print every decoded snapshot")
+    parser.add_argument("--repeat", type=int, default=0, help="decode every poll this many times and report the time")
+    parser.add_argument("--no-graphs", action="store_true", help="replay with the stop_graphs option")
+    parser.add_argument("--persistent", action="store_true", help="replay as a persistent connection")
+    parser.add_argument("--no-mmap", action="store_true", help="read the capture instead of memory mapping it")
+    args = parser.parse_args()
+
+    # capture_sessions copies the frames, so they outlive the mapping
+    sessions = list(capture_sessions(read_capture(args.capture, use_mmap=not args.no_mmap)))
+    print(f"{len(sessions)} polls in {args.capture}")
+    asyncio.run(replay(sessions, args))
+
+if __name__ == "__main__":
+    main()